@@ -0,0 +1,246 @@
+import asyncio
+import time
+from datetime import timedelta
+
+from batch import BATCH_IN_FLIGHT, BatchResult
+from config import (BASE_URL, CACHE, RATE, SINGLE_FLIGHT,  # noqa: F401
+                    cache_from_env, cassette_from_env, limiter_for, single_flight_from_env)
+from decoders import loads
+
+# Defaults for the shared aiohttp connector
+LIMIT = 1000            # total connections kept by the session
+LIMIT_PER_HOST = 100    # connections per host
+KEEPALIVE_TIMEOUT = 30  # seconds an idle connection stays open
+
+
+class Response:
+    """Already read response with the part of the requests.Response interface
+    the scenario checks use, so one check works for both clients."""
+
+    def __init__(self, method, url, status_code, headers, content, elapsed, timing=None):
+        self.method = method
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.elapsed = elapsed
+        # timing record of the request, see timing.py
+        self.timing = timing
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        if self.timing is None:
+            return loads(self.content)
+        start = time.perf_counter()
+        try:
+            return loads(self.content)
+        finally:
+            spent = time.perf_counter() - start
+            self.timing["decode"] += spent
+            self.timing["total"] += spent
+
+
+def _trace_config():
+    """aiohttp trace hooks filling the timing record passed as trace_request_ctx.
+    aiohttp does not report the TLS handshake apart, it is part of connect."""
+    import aiohttp
+
+    def started(phase):
+        async def hook(session, context, params):
+            if context.trace_request_ctx is not None:
+                context.trace_request_ctx["_" + phase] = time.perf_counter()
+        return hook
+
+    def finished(phase):
+        async def hook(session, context, params):
+            record = context.trace_request_ctx
+            if record is not None:
+                record[phase] += time.perf_counter() - record.pop("_" + phase)
+        return hook
+
+    trace = aiohttp.TraceConfig()
+    trace.on_dns_resolvehost_start.append(started("dns"))
+    trace.on_dns_resolvehost_end.append(finished("dns"))
+    trace.on_connection_create_start.append(started("connect"))
+    trace.on_connection_create_end.append(finished("connect"))
+    return trace
+
+
+class AsyncClient:
+    """One aiohttp session for all scenarios of an event loop."""
+
+    def __init__(self, base_url=BASE_URL, limit=LIMIT, limit_per_host=LIMIT_PER_HOST,
+                 keepalive_timeout=KEEPALIVE_TIMEOUT, cassette=None, cache=None,
+                 limiter=None, metrics=None, single_flight=None):
+        self.base_url = base_url
+        # cassette.Recorder or cassette.Player
+        self.cassette = cassette
+        # cache.ResponseCache for GET responses, None sends every request
+        self.cache = cache
+        # ratelimit.AdaptiveLimiter pacing and retrying throttled requests
+        self.limiter = limiter
+        # metrics.Metrics counting every request for the live view
+        self.metrics = metrics
+        # singleflight.SingleFlight sharing concurrent identical GETs
+        self.single_flight = single_flight
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.requests_sent = 0
+        # callables getting the timing record of every request, see timing.py
+        self.hooks = []
+        self._session = None
+
+    def url(self, uri):
+        return self.base_url + uri
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=self.limit,
+                                             limit_per_host=self.limit_per_host,
+                                             keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  trace_configs=[_trace_config()])
+        return self._session
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    async def request(self, type, uri, data={}, headers={}):
+        if self.metrics is not None:
+            return await self.metrics.call_async(
+                type, uri, lambda: self._request(type, uri, data, headers))
+        return await self._request(type, uri, data, headers)
+
+    async def _request(self, type, uri, data, headers):
+        url = self.url(uri)
+        if self.cassette is not None and self.cassette.replaying:
+            status, recorded_headers, content, elapsed = self.cassette.play(type, uri, data)
+            return Response(type, url, status, recorded_headers, bytes(content),
+                            timedelta(seconds=elapsed))
+        if self.single_flight is not None:
+            from singleflight import key_of
+            key = key_of(type, uri, data, headers)
+            if key is not None:
+                return await self.single_flight.call_async(
+                    key, lambda: self._fetch(type, uri, data, headers))
+        return await self._fetch(type, uri, data, headers)
+
+    async def _fetch(self, type, uri, data, headers):
+        if self.cache is not None and type == "GET":
+            response = await self._cached_request(type, uri, headers)
+        else:
+            response = await self._send(type, uri, data, headers)
+            if self.cache is not None and type in ("POST", "PUT", "PATCH", "DELETE"):
+                self.cache.invalidate(self.url(uri))
+        # only the answer the caller gets: a 304 merged with the cached entry,
+        # not the revalidation itself or the attempts the limiter retried
+        if self.cassette is not None:
+            self.cassette.record(type, uri, data, response.status_code, response.headers,
+                                 response.content, response.elapsed.total_seconds())
+        return response
+
+    async def batch(self, items, in_flight=BATCH_IN_FLIGHT):
+        """Async Client.batch(): at most `in_flight` requests of the batch
+        are awaited at once, results come back in submission order."""
+        items = [tuple(item) for item in items]
+        semaphore = asyncio.Semaphore(max(in_flight, 1))
+
+        async def send(item):
+            method, uri, payload = (item + ({},))[:3]
+            async with semaphore:
+                try:
+                    return BatchResult(item, await self.request(method, uri, payload))
+                except Exception as error:
+                    return BatchResult(item, error=error)
+
+        return list(await asyncio.gather(*(send(item) for item in items)))
+
+    async def _cached_request(self, type, uri, headers):
+        url = self.url(uri)
+        entry, fresh = self.cache.lookup(url)
+        if entry is not None and not fresh:
+            headers = dict(headers, **entry.validators())
+        if not fresh:
+            response = await self._send(type, uri, {}, headers)
+            if entry is None or response.status_code != 304:
+                self.cache.store(url, response.status_code, response.headers,
+                                 response.content, response.elapsed.total_seconds())
+                return response
+            self.cache.refreshed(entry, response.headers)
+        response = Response(type, url, entry.status, entry.headers, entry.content, timedelta(0))
+        response.from_cache = True
+        return response
+
+    async def _send(self, type, uri, data, headers):
+        if self.limiter is not None:
+            return await self.limiter.call_async(lambda: self._send_once(type, uri, data, headers))
+        return await self._send_once(type, uri, data, headers)
+
+    async def _send_once(self, type, uri, data, headers):
+        url = self.url(uri)
+        self.requests_sent += 1
+        record = None
+        if self.hooks:
+            from timing import new_record
+            record = new_record(type, uri)
+        start = time.perf_counter()
+        async with self._get_session().request(type, url, data=data, headers=headers,
+                                               trace_request_ctx=record) as response:
+            headers_at = time.perf_counter()
+            content = await response.read()
+        elapsed = time.perf_counter() - start
+        if record is not None:
+            record["total"] = elapsed
+            record["ttfb"] = max(headers_at - start - record["dns"] - record["connect"], 0.0)
+            record["download"] = elapsed - (headers_at - start)
+            record["status"] = response.status
+            record["bytes"] = len(content)
+            for hook in self.hooks:
+                hook(record)
+        return Response(type, url, response.status, response.headers, content,
+                        timedelta(seconds=elapsed), record)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self.cassette is not None:
+            self.cassette.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+_client = None
+
+
+def configure(**kwargs):
+    """Replace the shared async client. Close the old one with
+    `await get_client().close()` first if it was already used."""
+    global _client
+    _client = AsyncClient(**kwargs)
+    return _client
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = AsyncClient(cassette=cassette_from_env(), cache=cache_from_env(),
+                              limiter=limiter_for(RATE), single_flight=single_flight_from_env())
+    return _client
+
+
+async def send_request(type, uri, data = {}, headers = {}):
+    return await get_client().request(type, uri, data, headers)
+
+
+async def send_batch(items, in_flight=BATCH_IN_FLIGHT):
+    return await get_client().batch(items, in_flight)
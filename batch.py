@@ -0,0 +1,21 @@
+"""What a batch of requests gives back, shared by client.py and
+async_client.py without importing either HTTP library."""
+
+BATCH_IN_FLIGHT = 8     # requests of one batch sent at the same time
+
+
+class BatchResult:
+    """Outcome of one batch item: the response, or the exception it raised."""
+
+    def __init__(self, item, response=None, error=None):
+        self.item = item
+        self.response = response
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        outcome = self.response.status_code if self.ok else repr(self.error)
+        return "BatchResult(%s %s -> %s)" % (self.item[0], self.item[1], outcome)
@@ -0,0 +1,148 @@
+"""In-process cache for idempotent GET responses.
+
+    REQRES_CACHE=1 python main.py --mock
+    python main.py --mock --cache
+    client.configure(cache=ResponseCache(max_entries=512, ttl=30))
+
+Only 200 responses to GET are stored. An entry is fresh for
+min(Cache-Control max-age, ttl) seconds, or for `ttl` when the server sends
+no max-age. A fresh entry is served without a request. A stale entry with
+an ETag or Last-Modified is revalidated with If-None-Match /
+If-Modified-Since, and a 304 answer makes it fresh again. `no-store`
+responses are never kept, and `no-cache` ones are revalidated every time.
+Past `max_entries` the least recently used entry is dropped, and a
+POST, PUT, PATCH or DELETE to a URL drops its entry. Cache hits send no
+request, so they have no timing.py record, but metrics.py counts them and
+a cassette records them like any other answer.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+MAX_ENTRIES = 256
+TTL = 60.0      # seconds, upper bound for the freshness of an entry
+
+
+def cache_control(headers):
+    """{'max-age': '60', 'no-cache': None, ...} from the Cache-Control header."""
+    directives = {}
+    for part in (headers.get("Cache-Control") or "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"') or None
+    return directives
+
+
+class Entry:
+    def __init__(self, status, headers, content, elapsed, expires):
+        self.status = status
+        self.headers = dict(headers)
+        self.content = content
+        # elapsed of the request that fetched the body
+        self.elapsed = elapsed
+        self.expires = expires
+        self.etag = headers.get("ETag")
+        self.last_modified = headers.get("Last-Modified")
+
+    def fresh(self, now=None):
+        return (time.monotonic() if now is None else now) < self.expires
+
+    def validators(self):
+        """Headers for a conditional request, empty when there are none."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """LRU map of URL -> Entry, shared by the threads of one client."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+    def lookup(self, url):
+        """(entry, fresh) for `url`, entry is None when nothing is stored.
+        A fresh entry counts as a hit; everything else is counted once
+        the request is answered, see store()/refreshed()."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None, False
+            self._entries.move_to_end(url)
+            if entry.fresh():
+                self.hits += 1
+                return entry, True
+            return entry, False
+
+    def _lifetime(self, directives):
+        if "no-cache" in directives:
+            return 0.0
+        try:
+            return min(float(directives["max-age"]), self.ttl)
+        except (KeyError, TypeError, ValueError):
+            return self.ttl
+
+    def store(self, url, status, headers, content, elapsed=0.0):
+        """Keeps a full response if it may be cached; counts a miss either way."""
+        directives = cache_control(headers)
+        with self._lock:
+            self.misses += 1
+            if status != 200 or "no-store" in directives:
+                self._entries.pop(url, None)
+                return None
+            entry = Entry(status, headers, content, elapsed,
+                          time.monotonic() + self._lifetime(directives))
+            if not entry.fresh() and not entry.validators():
+                self._entries.pop(url, None)
+                return None
+            self._entries[url] = entry
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return entry
+
+    def refreshed(self, entry, headers):
+        """The server answered 304 for `entry`: fresh again for a new lifetime."""
+        directives = cache_control(headers)
+        with self._lock:
+            self.revalidated += 1
+            entry.expires = time.monotonic() + self._lifetime(directives)
+            if headers.get("ETag"):
+                entry.etag = headers["ETag"]
+        return entry
+
+    def invalidate(self, url):
+        """Drops the entry of `url`, e.g. after a request that changed it."""
+        with self._lock:
+            self._entries.pop(url, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "revalidated": self.revalidated, "evictions": self.evictions}
+
+
+def format_stats(stats):
+    lookups = stats["hits"] + stats["misses"] + stats["revalidated"]
+    return ("cache: {hits} hits, {revalidated} revalidated, {misses} misses, "
+            "{entries} entries, {evictions} evicted".format(**stats)
+            + (", hit ratio %.0f%%" % (100.0 * (stats["hits"] + stats["revalidated"]) / lookups)
+               if lookups else ""))
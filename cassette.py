@@ -0,0 +1,155 @@
+"""Record/replay store for the responses of send_request.
+
+File layout (one file per run):
+
+    MAGIC
+    record*     meta JSON line + body bytes, meta = {"k", "s", "h", "t", "n"}
+    index       JSON {key: [[offset, size], ...]}
+    footer      8 bytes little-endian index offset + MAGIC
+
+The player maps the file into memory and only parses the index; records
+are decoded when a request asks for them. A file without the footer (the
+recorder was killed) is indexed by scanning the meta lines.
+"""
+import atexit
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+MAGIC = b"RQCASS1\n"
+FOOTER = struct.Struct("<Q")
+# describe the body on the wire, not the decoded body that is stored
+SKIP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+def body_hash(data):
+    if not data:
+        return "-"
+    if isinstance(data, dict):
+        data = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha1(data).hexdigest()[:16]
+
+
+def request_key(type, uri, data):
+    return "%s %s %s" % (type.upper(), uri, body_hash(data))
+
+
+def run_path(path):
+    """A directory gets a new file for every run."""
+    if os.path.isdir(path):
+        name = time.strftime("run-%Y%m%d-%H%M%S") + "-%d.cassette" % os.getpid()
+        return os.path.join(path, name)
+    return path
+
+
+class Recorder:
+    replaying = False
+
+    def __init__(self, path):
+        self.path = run_path(path)
+        self.index = {}
+        self._lock = threading.Lock()
+        self._file = open(self.path, "wb")
+        self._file.write(MAGIC)
+        atexit.register(self.close)
+
+    def record(self, type, uri, data, status, headers, body, elapsed):
+        key = request_key(type, uri, data)
+        meta = json.dumps({"k": key, "s": status,
+                           "h": {name: value for name, value in headers.items()
+                                 if name.lower() not in SKIP_HEADERS},
+                           "t": round(elapsed, 6), "n": len(body)},
+                          separators=(",", ":")).encode("utf-8") + b"\n"
+        with self._lock:
+            if self._file.closed:
+                return
+            offset = self._file.tell()
+            self._file.write(meta)
+            self._file.write(body)
+            self.index.setdefault(key, []).append([offset, len(meta) + len(body)])
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            offset = self._file.tell()
+            self._file.write(json.dumps(self.index, separators=(",", ":")).encode("utf-8"))
+            self._file.write(FOOTER.pack(offset) + MAGIC)
+            self._file.close()
+
+
+class Player:
+    """Answers requests from a recorded cassette, no network I/O.
+    Repeated requests get the recorded responses in order, then the last one again."""
+
+    replaying = True
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError("%s is not a cassette file" % path)
+        self.index = self._read_index()
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _read_index(self):
+        tail = FOOTER.size + len(MAGIC)
+        if len(self._map) >= len(MAGIC) + tail and self._map[-len(MAGIC):] == MAGIC:
+            offset = FOOTER.unpack(self._map[-tail:-len(MAGIC)])[0]
+            return json.loads(self._map[offset:-tail])
+        return self._scan()
+
+    def _scan(self):
+        index = {}
+        offset = len(MAGIC)
+        while offset < len(self._map):
+            end = self._map.find(b"\n", offset)
+            if end < 0:
+                break
+            meta = json.loads(self._map[offset:end])
+            size = end + 1 - offset + meta["n"]
+            if offset + size > len(self._map):
+                break
+            index.setdefault(meta["k"], []).append([offset, size])
+            offset += size
+        return index
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def play(self, type, uri, data):
+        """(status, headers, body, elapsed) recorded for the request."""
+        key = request_key(type, uri, data)
+        records = self.index.get(key)
+        if not records:
+            raise KeyError("No recorded response for %s" % key)
+        with self._lock:
+            call = self._calls.get(key, 0)
+            self._calls[key] = call + 1
+        offset, size = records[min(call, len(records) - 1)]
+        end = self._map.find(b"\n", offset)
+        meta = json.loads(self._map[offset:end])
+        body = self._map[end + 1:offset + size]
+        return meta["s"], meta["h"], body, meta["t"]
+
+    def close(self):
+        if not self._file.closed:
+            self._map.close()
+            self._file.close()
+
+
+def open_cassette(path, mode):
+    """Recorder for mode "record", Player for mode "replay"."""
+    if mode == "record":
+        return Recorder(path)
+    if mode == "replay":
+        return Player(path)
+    raise ValueError("Unknown cassette mode: %s" % mode)
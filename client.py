@@ -0,0 +1,359 @@
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from batch import BATCH_IN_FLIGHT, BatchResult
+from config import (BASE_URL, CACHE, CASSETTE, CASSETTE_MODE, RATE,  # noqa: F401
+                    SINGLE_FLIGHT, cache_from_env, cassette_from_env, limiter_for,
+                    single_flight_from_env)
+
+# Defaults for the shared connection pool
+POOL_CONNECTIONS = 10   # number of per-host pools kept alive
+POOL_MAXSIZE = 10       # connections kept per host
+POOL_BLOCK = False      # True - wait for a free connection instead of opening an extra one
+KEEP_ALIVE = True
+RETRIES = 0
+BACKOFF_FACTOR = 0.3
+RETRY_STATUSES = (502, 503, 504)
+
+# timing record of the request running on this thread, see timing.py
+_current = threading.local()
+DEFAULT = object()
+
+
+class _SocketCounter:
+    """Counts real socket connects, including reconnects of a pooled
+    connection that the server has closed, and times their DNS, TCP and
+    TLS phases for the request that opened them."""
+
+    num_sockets = 0
+
+    def _new_conn(self):
+        conn = super()._new_conn()
+        connect = conn.connect
+        open_socket = conn._new_conn
+        host = conn._dns_host
+
+        def timed_open_socket():
+            timing = getattr(_current, "timing", None)
+            if timing is None:
+                return open_socket()
+            # resolve here to time DNS apart from the TCP handshake
+            start = time.perf_counter()
+            try:
+                conn._dns_host = socket.getaddrinfo(host, conn.port, 0,
+                                                    socket.SOCK_STREAM)[0][4][0]
+            except OSError:
+                pass  # urllib3 resolves again and raises its own error
+            resolved = time.perf_counter()
+            timing["dns"] += resolved - start
+            try:
+                return open_socket()
+            finally:
+                conn._dns_host = host
+                timing["connect"] += time.perf_counter() - resolved
+
+        def counted_connect():
+            self.num_sockets += 1
+            timing = getattr(_current, "timing", None)
+            if timing is None:
+                return connect()
+            before = timing["dns"] + timing["connect"]
+            start = time.perf_counter()
+            try:
+                connect()
+            finally:
+                spent = time.perf_counter() - start
+                timing["tls"] += spent - (timing["dns"] + timing["connect"] - before)
+
+        conn._new_conn = timed_open_socket
+        conn.connect = counted_connect
+        return conn
+
+
+class _HTTPPool(_SocketCounter, HTTPConnectionPool):
+    pass
+
+
+class _HTTPSPool(_SocketCounter, HTTPSConnectionPool):
+    pass
+
+
+class PoolAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _HTTPPool,
+                                                   "https": _HTTPSPool}
+
+
+class Client:
+    """Pooled HTTP client shared by main.py and reqres_pytest.py.
+
+    All requests go through one requests.Session, so TCP/TLS connections
+    are reused between scenarios instead of being opened for every call.
+    """
+
+    def __init__(self, base_url=BASE_URL, pool_connections=POOL_CONNECTIONS,
+                 pool_maxsize=POOL_MAXSIZE, pool_block=POOL_BLOCK,
+                 keep_alive=KEEP_ALIVE, retries=RETRIES,
+                 backoff_factor=BACKOFF_FACTOR, retry_statuses=RETRY_STATUSES,
+                 cassette=None, decoder=DEFAULT, cache=None, limiter=None, metrics=None,
+                 single_flight=None):
+        self.base_url = base_url
+        # bytes -> object for response.json(), None keeps requests' own json()
+        if decoder is DEFAULT:
+            import decoders
+            decoder = decoders.loads
+        self.decoder = decoder
+        # cassette.Recorder or cassette.Player
+        self.cassette = cassette
+        # cache.ResponseCache for GET responses, None sends every request
+        self.cache = cache
+        # ratelimit.AdaptiveLimiter pacing and retrying throttled requests
+        self.limiter = limiter
+        # metrics.Metrics counting every request for the live view
+        self.metrics = metrics
+        # singleflight.SingleFlight sharing concurrent identical GETs
+        self.single_flight = single_flight
+        # callables getting the timing record of every request, see timing.py
+        self.hooks = []
+        self.keep_alive = keep_alive
+        retry = Retry(total=retries, backoff_factor=backoff_factor,
+                      status_forcelist=retry_statuses, allowed_methods=None,
+                      raise_on_status=False)
+        self.adapter = PoolAdapter(pool_connections=pool_connections,
+                                   pool_maxsize=pool_maxsize,
+                                   pool_block=pool_block, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+        self.requests_sent = 0
+        self._lock = threading.Lock()
+        # counters carried over from pools dropped by close()
+        self._closed_requests = 0
+        self._closed_connections = 0
+
+    def url(self, uri):
+        return self.base_url + uri
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def request(self, type, uri, data={}, headers={}):
+        if self.metrics is not None:
+            return self.metrics.call(type, uri, lambda: self._request(type, uri, data, headers))
+        return self._request(type, uri, data, headers)
+
+    def _request(self, type, uri, data, headers):
+        if self.cassette is not None and self.cassette.replaying:
+            response = replayed_response(type, self.url(uri), *self.cassette.play(type, uri, data))
+            return self._set_decoder(response)
+        if self.single_flight is not None:
+            from singleflight import key_of
+            key = key_of(type, uri, data, headers)
+            if key is not None:
+                return self.single_flight.call(key, lambda: self._fetch(type, uri, data, headers))
+        return self._fetch(type, uri, data, headers)
+
+    def _fetch(self, type, uri, data, headers):
+        if self.cache is not None and type == "GET":
+            response = self._cached_request(type, uri, headers)
+        else:
+            response = self._send(type, uri, data, headers)
+            if self.cache is not None and type in ("POST", "PUT", "PATCH", "DELETE"):
+                self.cache.invalidate(self.url(uri))
+        # only the answer the caller gets: a 304 merged with the cached entry,
+        # not the revalidation itself or the attempts the limiter retried
+        if self.cassette is not None:
+            self.cassette.record(type, uri, data, response.status_code, response.headers,
+                                 response.content, response.elapsed.total_seconds())
+        return response
+
+    def _send(self, type, uri, data, headers):
+        if self.limiter is not None:
+            return self.limiter.call(lambda: self._send_once(type, uri, data, headers))
+        return self._send_once(type, uri, data, headers)
+
+    def _send_once(self, type, uri, data, headers):
+        with self._lock:
+            self.requests_sent += 1
+        if not self.hooks:
+            return self._set_decoder(
+                self.session.request(type, self.url(uri), headers=headers, data=data))
+        return self._timed_request(type, uri, data, headers)
+
+    def batch(self, items, in_flight=BATCH_IN_FLIGHT):
+        """Sends (method, uri[, payload]) items with up to `in_flight` of them
+        on the wire at once. Returns one BatchResult per item, in submission
+        order; an item that raised has its exception in .error instead of
+        stopping the others. Keep in_flight <= pool_maxsize, or the extra
+        connections are opened and dropped for every request."""
+        items = [tuple(item) for item in items]
+        results = [None] * len(items)
+
+        def send(index):
+            method, uri, payload = (items[index] + ({},))[:3]
+            try:
+                results[index] = BatchResult(items[index], self.request(method, uri, payload))
+            except Exception as error:
+                results[index] = BatchResult(items[index], error=error)
+
+        with ThreadPoolExecutor(max_workers=max(min(in_flight, len(items)), 1)) as pool:
+            list(pool.map(send, range(len(items))))
+        return results
+
+    def _cached_request(self, type, uri, headers):
+        url = self.url(uri)
+        entry, fresh = self.cache.lookup(url)
+        if entry is not None and not fresh:
+            headers = dict(headers, **entry.validators())
+        if not fresh:
+            response = self._send(type, uri, {}, headers)
+            if entry is None or response.status_code != 304:
+                self.cache.store(url, response.status_code, response.headers,
+                                 response.content, response.elapsed.total_seconds())
+                return response
+            self.cache.refreshed(entry, response.headers)
+        response = replayed_response(type, url, entry.status, entry.headers, entry.content, 0.0)
+        response.replayed = False
+        response.from_cache = True
+        return self._set_decoder(response)
+
+    def _timed_request(self, type, uri, data, headers):
+        from timing import new_record
+        record = _current.timing = new_record(type, uri)
+        start = time.perf_counter()
+        try:
+            response = self.session.request(type, self.url(uri), headers=headers, data=data)
+        finally:
+            _current.timing = None
+        record["total"] = time.perf_counter() - start
+        # requests' elapsed ends when the headers arrive, the body is read after it
+        headers_at = response.elapsed.total_seconds()
+        record["ttfb"] = max(headers_at - record["dns"] - record["connect"] - record["tls"], 0.0)
+        record["download"] = max(record["total"] - headers_at, 0.0)
+        record["status"] = response.status_code
+        record["bytes"] = len(response.content)
+        response.json = timed_json(self._set_decoder(response).json, record)
+        for hook in self.hooks:
+            hook(record)
+        return response
+
+    def _set_decoder(self, response):
+        """response.json() decodes the raw body with self.decoder, skipping
+        requests' charset detection."""
+        if self.decoder is not None:
+            decoder = self.decoder
+            response.json = lambda **kwargs: decoder(response.content)
+        return response
+
+    def _pools(self):
+        pools = self.adapter.poolmanager.pools
+        return [pools[key] for key in pools.keys()]
+
+    def stats(self):
+        """Connection usage for the current run: how many requests were sent
+        and how many of them had to open a new connection."""
+        opened = self._closed_connections
+        served = self._closed_requests
+        for pool in self._pools():
+            opened += pool.num_sockets
+            served += pool.num_requests
+        stats = {
+            "requests": self.requests_sent,
+            "connections_opened": opened,
+            "connections_reused": max(served - opened, 0),
+        }
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        if self.limiter is not None:
+            stats["limiter"] = self.limiter.stats()
+        if self.single_flight is not None:
+            stats["single_flight"] = self.single_flight.stats()
+        return stats
+
+    def close(self):
+        for pool in self._pools():
+            self._closed_connections += pool.num_sockets
+            self._closed_requests += pool.num_requests
+        self.session.close()
+        if self.cassette is not None:
+            self.cassette.close()
+
+
+def replayed_response(type, url, status, headers, body, elapsed):
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = bytes(body)
+    response.url = url
+    response.elapsed = timedelta(seconds=elapsed)
+    response.request = requests.Request(type, url).prepare()
+    response.replayed = True
+    return response
+
+
+def timed_json(decode, record):
+    """Wraps response.json so the decode time lands in the timing record."""
+    def json(**kwargs):
+        start = time.perf_counter()
+        try:
+            return decode(**kwargs)
+        finally:
+            spent = time.perf_counter() - start
+            record["decode"] += spent
+            record["total"] += spent
+    return json
+
+
+def format_stats(stats):
+    text = ("requests: {requests}, new connections: {connections_opened}, "
+            "reused connections: {connections_reused}".format(**stats))
+    if "cache" in stats:
+        import cache
+        text += "\n" + cache.format_stats(stats["cache"])
+    if "limiter" in stats:
+        import ratelimit
+        text += "\n" + ratelimit.format_stats(stats["limiter"])
+    if "single_flight" in stats:
+        import singleflight
+        text += "\n" + singleflight.format_stats(stats["single_flight"])
+    return text
+
+
+_client = None
+
+
+def configure(**kwargs):
+    """Replace the shared client, e.g. configure(pool_maxsize=20, retries=3)."""
+    global _client
+    if _client is not None:
+        _client.close()
+    _client = Client(**kwargs)
+    return _client
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = Client(cassette=cassette_from_env(), cache=cache_from_env(),
+                         limiter=limiter_for(RATE), single_flight=single_flight_from_env())
+    return _client
+
+
+def send_batch(items, in_flight=BATCH_IN_FLIGHT):
+    return get_client().batch(items, in_flight)
+
+
+def send_request(type, uri, data = {}, headers = {}):
+    return get_client().request(type, uri, data, headers)
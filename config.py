@@ -0,0 +1,52 @@
+"""Settings read from the environment, and the helpers building the
+client parts they turn on.
+
+Kept apart from client.py so the CLI and async_client.py can use them
+without importing requests; client.py and async_client.py re-export them.
+"""
+import os
+
+# REQRES_BASE_URL=http://127.0.0.1:8000/api/ points the suite to mock_server.py
+BASE_URL = os.environ.get("REQRES_BASE_URL", "https://reqres.in/api/")
+# REQRES_CASSETTE=runs/ REQRES_CASSETTE_MODE=record|replay, see cassette.py
+CASSETTE = os.environ.get("REQRES_CASSETTE")
+CASSETTE_MODE = os.environ.get("REQRES_CASSETTE_MODE", "replay")
+# REQRES_CACHE=1 serves repeated GETs from an in-process cache, see cache.py
+CACHE = os.environ.get("REQRES_CACHE", "") not in ("", "0")
+# REQRES_SINGLE_FLIGHT=1 shares one call between concurrent identical GETs, see singleflight.py
+SINGLE_FLIGHT = os.environ.get("REQRES_SINGLE_FLIGHT", "") not in ("", "0")
+# REQRES_RATE=20 paces requests starting at 20 req/s, see ratelimit.py
+RATE = float(os.environ.get("REQRES_RATE") or 0) or None
+# REQRES_METRICS_PORT=9100 serves live metrics of main.py / load.py / soak.py, see metrics.py
+METRICS_PORT = int(os.environ.get("REQRES_METRICS_PORT") or 0) or None
+# seconds between two console summaries of the live metrics, 0 turns them off
+METRICS_INTERVAL = float(os.environ.get("REQRES_METRICS_INTERVAL") or 10)
+
+
+def cassette_from_env():
+    if not CASSETTE:
+        return None
+    from cassette import open_cassette
+    return open_cassette(CASSETTE, CASSETTE_MODE)
+
+
+def cache_from_env():
+    if not CACHE:
+        return None
+    from cache import ResponseCache
+    return ResponseCache()
+
+
+def single_flight_from_env():
+    if not SINGLE_FLIGHT:
+        return None
+    from singleflight import SingleFlight
+    return SingleFlight()
+
+
+def limiter_for(rate):
+    """AdaptiveLimiter starting at `rate` req/s, None without a rate."""
+    if not rate:
+        return None
+    from ratelimit import AdaptiveLimiter
+    return AdaptiveLimiter(rate=rate)
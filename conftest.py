@@ -0,0 +1,95 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import client
+import results
+import timing
+import validation_pool
+from client import get_client, format_stats
+
+# futures of @background tests, started before the test loop
+_background = {}
+_server = None
+_timings = None
+
+
+def pytest_addoption(parser):
+    parser.addoption("--base-url", default=client.BASE_URL,
+                     help="reqres API root, default %(default)s")
+    parser.addoption("--mock", action="store_true",
+                     help="run against mock_server.py started in the background")
+    parser.addoption("--record", metavar="PATH",
+                     help="save every response to a cassette file (a directory gets one file per run)")
+    parser.addoption("--replay", metavar="PATH",
+                     help="answer requests from a recorded cassette, no network")
+    parser.addoption("--timings", metavar="PATH", default=timing.TIMINGS,
+                     help="dump the per-request latency breakdown to PATH (.json or .csv)")
+    parser.addoption("--results", metavar="PATH", default=results.RESULTS,
+                     help="stream one JSONL record per scenario run to PATH, see results.py")
+
+
+def pytest_configure(config):
+    global _server, _timings
+    base_url = config.getoption("--base-url")
+    if config.getoption("--mock"):
+        from mock_server import MockServer
+        _server = MockServer().start()
+        base_url = _server.base_url
+    record, replay = config.getoption("--record"), config.getoption("--replay")
+    if record or replay:
+        from cassette import open_cassette
+        cassette = open_cassette(record or replay, "record" if record else "replay")
+    else:
+        cassette = client.cassette_from_env()
+    if base_url != client.BASE_URL or cassette is not None:
+        client.configure(base_url=base_url, cassette=cassette, cache=client.cache_from_env(),
+                         limiter=client.limiter_for(client.RATE),
+                         single_flight=client.single_flight_from_env())
+    if config.getoption("--timings"):
+        _timings = timing.attach(get_client())
+    if config.getoption("--results"):
+        results.open_writer(config.getoption("--results"))
+
+
+def pytest_unconfigure(config):
+    get_client().close()
+    results.close_writer()
+    if _timings is not None:
+        _timings.dump(config.getoption("--timings"))
+    if _server is not None:
+        _server.stop()
+
+
+def pytest_collection_modifyitems(items):
+    # background tests are reported last, after they had time to finish
+    items.sort(key=lambda item: getattr(getattr(item, "obj", None), "background", False))
+
+
+def pytest_runtestloop(session):
+    slow = [item for item in session.items
+            if getattr(getattr(item, "obj", None), "background", False)]
+    if slow and not session.config.option.collectonly:
+        pool = ThreadPoolExecutor(max_workers=len(slow))
+        for item in slow:
+            _background[item.nodeid] = pool.submit(item.obj)
+        pool.shutdown(wait=False)
+
+
+def pytest_pyfunc_call(pyfuncitem):
+    future = _background.pop(pyfuncitem.nodeid, None)
+    if future is None:
+        return None
+    future.result()
+    return True
+
+
+def pytest_terminal_summary(terminalreporter):
+    terminalreporter.write_sep("-", "connection pool")
+    terminalreporter.write_line(format_stats(get_client().stats()))
+    if _timings is not None:
+        terminalreporter.write_line("request timings: %s"
+                                    % terminalreporter.config.getoption("--timings"))
+    lines = validation_pool.report.lines()
+    if lines:
+        terminalreporter.write_sep("-", "schema checks")
+        for line in lines:
+            terminalreporter.write_line(line)
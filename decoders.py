@@ -0,0 +1,167 @@
+"""JSON decoding straight from the response bytes.
+
+The backend is msgspec or orjson when installed, the stdlib json module
+otherwise; REQRES_JSON=json|orjson|msgspec picks one explicitly. Both
+clients use loads() for response.json().
+
+decode_typed() decodes into msgspec Structs generated from the schemas in
+schemas.py, so type and required-field checks happen while decoding and
+no separate validate() pass is needed. Without msgspec it falls back to
+loads() plus the cached jsonschema validator and returns the __slots__
+records from models.py.
+"""
+import json
+import os
+from typing import List, Optional, Union
+
+BACKENDS = ("msgspec", "orjson", "json")
+# id(schema) or (id(schema), envelope, many) -> (schema, Struct)
+_structs = {}
+
+
+def _msgspec_loads():
+    import msgspec
+    decode = msgspec.json.Decoder().decode
+
+    def loads(data):
+        try:
+            return decode(data)
+        except msgspec.DecodeError as error:
+            # same error type as the other backends
+            raise ValueError(str(error))
+    return loads
+
+
+def _orjson_loads():
+    import orjson
+    return orjson.loads
+
+
+def _json_loads():
+    return json.loads
+
+
+_FACTORIES = {"msgspec": _msgspec_loads, "orjson": _orjson_loads, "json": _json_loads}
+
+
+def get_loads(backend=None):
+    """(backend name, loads function); the first installed backend by default."""
+    names = [backend] if backend else BACKENDS
+    for name in names:
+        try:
+            return name, _FACTORIES[name]()
+        except ImportError:
+            if backend:
+                raise
+    raise ImportError("No JSON backend available")
+
+
+BACKEND, loads = get_loads(os.environ.get("REQRES_JSON"))
+
+
+def has_msgspec():
+    try:
+        import msgspec  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _field_type(spec):
+    kinds = spec.get("type")
+    kinds = kinds if isinstance(kinds, list) else [kinds]
+    types = []
+    for kind in kinds:
+        if kind == "number":
+            types += [int, float]
+        elif kind in ("integer", "string", "boolean", "null"):
+            types.append({"integer": int, "string": str, "boolean": bool,
+                          "null": type(None)}[kind])
+        elif kind == "array":
+            types.append(list)
+        else:
+            types.append(dict)
+    return Union[tuple(types)]
+
+
+def struct_for(schema, name=None):
+    """msgspec Struct type for an object schema, generated once per schema."""
+    schema_struct = _structs.get(id(schema))
+    struct = schema_struct[1] if schema_struct and schema_struct[0] is schema else None
+    if struct is None:
+        import msgspec
+        from models import model_name
+        required = schema.get("required", [])
+        fields = []
+        for field, spec in schema.get("properties", {}).items():
+            if field in required:
+                fields.append((field, _field_type(spec)))
+            else:
+                fields.append((field, Optional[_field_type(spec)], None))
+        struct = msgspec.defstruct(name or model_name(schema), fields,
+                                   kw_only=True)
+        _structs[id(schema)] = schema, struct
+    return struct
+
+
+def _envelope(schema, envelope, many):
+    key = (id(schema), envelope, many)
+    schema_struct = _structs.get(key)
+    struct = schema_struct[1] if schema_struct and schema_struct[0] is schema else None
+    if struct is None:
+        import msgspec
+        item = struct_for(schema)
+        fields = [(envelope, List[item] if many else item)]
+        if many:
+            fields.append(("total_pages", int, 1))
+        struct = msgspec.defstruct(
+            item.__name__ + ("Page" if many else "Response"), fields, kw_only=True)
+        _structs[key] = schema, struct
+    return struct
+
+
+def _validated(body, schema, envelope, many):
+    from models import model_for
+    from validators import validate
+    model = model_for(schema)
+    value = body[envelope] if envelope else body
+    for item in (value if many else [value]):
+        validate(item, schema)
+    if many:
+        return [model.from_dict(item) for item in value]
+    return model.from_dict(value)
+
+
+def _decode_struct(content, target):
+    import msgspec
+    from jsonschema.exceptions import ValidationError
+    try:
+        return msgspec.json.decode(content, type=target)
+    except msgspec.ValidationError as error:
+        raise ValidationError(str(error))
+
+
+def decode_typed(content, schema, envelope=None, many=False):
+    """Decodes `content` checked against `schema`.
+
+    envelope    key the schema applies to, e.g. "data" for users/2
+    many        body[envelope] is a list of such objects (a listing page)
+
+    Returns the Struct (or list of Structs) for body[envelope], or for the
+    whole body without an envelope. A jsonschema ValidationError is raised
+    when the body does not match.
+    """
+    if not has_msgspec():
+        return _validated(loads(content), schema, envelope, many)
+    if not envelope:
+        return _decode_struct(content, struct_for(schema))
+    return getattr(_decode_struct(content, _envelope(schema, envelope, many)), envelope)
+
+
+def decode_page(content, schema, envelope="data"):
+    """(items, total_pages) of a listing page, items checked against `schema`."""
+    if not has_msgspec():
+        body = loads(content)
+        return _validated(body, schema, envelope, True), body.get("total_pages", 1)
+    page = _decode_struct(content, _envelope(schema, envelope, True))
+    return getattr(page, envelope), page.total_pages
@@ -0,0 +1,270 @@
+"""load.py spread over several processes or machines, merged into one report.
+
+    python distributed.py --mock -w 4 -d 30 -m user_data=5,user_login=2
+    python distributed.py --listen 0.0.0.0:7070 --nodes 3 -d 60 --base-url https://reqres.in/api/
+    REQRES_AUTHKEY=... python distributed.py --connect coordinator-host:7070     # on every node
+
+Every worker runs load.run_load() on its own event loop. Every `interval`
+seconds it sends the coordinator that interval's latencies as one
+timing.Histogram per endpoint. A histogram is a few hundred bucket counts
+whatever the number of requests. The coordinator merges them, so the
+percentiles and the aggregate RPS cover all workers without ever holding
+the raw samples.
+
+Local workers talk to the coordinator over pipes. Remote nodes connect to
+--listen with multiprocessing.connection and the shared --authkey (or
+REQRES_AUTHKEY). The messages are pickles, so whoever knows the key can
+run code on the other side: there is no default key. Without one, --listen
+makes up a random key and prints it for the nodes.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import secrets
+import time
+import traceback
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client as Connect, Listener, wait
+
+import async_client
+from load import CONCURRENCY, DURATION, parse_mix, print_load_report, run_load
+from timing import Histogram
+
+WORKERS = multiprocessing.cpu_count()
+INTERVAL = 1.0          # seconds between two sample batches of a worker
+AUTHKEY = os.environ.get("REQRES_AUTHKEY")
+
+
+class HistogramStats:
+    """LoadStats replacement keeping one histogram per endpoint. drain()
+    hands over what was collected since the previous call."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def add(self, key, seconds, ok):
+        histogram = self.latencies.get(key)
+        if histogram is None:
+            histogram = self.latencies[key] = Histogram()
+        histogram.add(seconds)
+        if not ok:
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    def drain(self):
+        batch = {"latencies": {key: histogram.to_dict()
+                               for key, histogram in self.latencies.items()},
+                 "errors": self.errors}
+        self.latencies = {}
+        self.errors = {}
+        return batch
+
+
+class Aggregate:
+    """Merged batches of all workers."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def merge(self, batch):
+        for key, data in batch["latencies"].items():
+            self.latencies.setdefault(key, Histogram()).merge(Histogram.from_dict(data))
+        for key, count in batch["errors"].items():
+            self.errors[key] = self.errors.get(key, 0) + count
+
+    def requests(self):
+        return sum(histogram.count for histogram in self.latencies.values())
+
+    def report(self, duration):
+        """Rows in the format of load.LoadStats.report()."""
+        rows = []
+        for key in sorted(self.latencies):
+            histogram = self.latencies[key]
+            rows.append({
+                "endpoint": key,
+                "requests": histogram.count,
+                "errors": self.errors.get(key, 0),
+                "rps": histogram.count / duration if duration else 0.0,
+                "p50": histogram.percentile(50),
+                "p95": histogram.percentile(95),
+                "p99": histogram.percentile(99),
+                "max": histogram.max or 0.0,
+            })
+        return rows
+
+
+async def _stream_load(conn, job):
+    stats = HistogramStats()
+    load = asyncio.ensure_future(run_load(parse_mix(job["mix"]), job["duration"],
+                                          job["concurrency"], job["rps"], job["seed"],
+                                          stats=stats))
+    while not load.done():
+        await asyncio.wait([load], timeout=job["interval"])
+        if not load.done():
+            conn.send(("samples", stats.drain()))
+    _, elapsed = load.result()
+    conn.send(("done", stats.drain(), elapsed))
+
+
+def run_worker(conn, job):
+    """Runs one job and streams its samples to `conn`, in a worker process
+    or on a remote node."""
+    try:
+        async_client.configure(base_url=job["base_url"],
+                               limit_per_host=max(job["concurrency"],
+                                                  async_client.LIMIT_PER_HOST))
+        asyncio.run(_stream_load(conn, job))
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+def start_local(job, workers):
+    """`workers` processes running `job`, each with its own seed; their pipe ends."""
+    context = multiprocessing.get_context("spawn")
+    conns = []
+    for index in range(workers):
+        parent, child = context.Pipe(duplex=False)
+        seed = None if job["seed"] is None else job["seed"] + index
+        context.Process(target=run_worker, args=(child, dict(job, seed=seed)),
+                        daemon=True).start()
+        child.close()
+        conns.append(parent)
+    return conns
+
+
+def accept_nodes(address, nodes, job, authkey):
+    """Waits for `nodes` remote workers on `address` and sends them `job`."""
+    conns = []
+    with Listener(address, authkey=authkey) as listener:
+        print("waiting for %d nodes on %s:%d" % ((nodes,) + address))
+        while len(conns) < nodes:
+            try:
+                conn = listener.accept()
+            except AuthenticationError as error:
+                print("node rejected: %s" % error)
+                continue
+            index = len(conns)
+            seed = None if job["seed"] is None else job["seed"] + index
+            conn.send(dict(job, seed=seed))
+            conns.append(conn)
+            print("node %d connected from %s" % (index + 1, listener.last_accepted[0]))
+    return conns
+
+
+def serve_node(address, authkey):
+    """Remote worker: takes one job from the coordinator and runs it."""
+    conn = Connect(address, authkey=authkey)
+    run_worker(conn, conn.recv())
+
+
+def coordinate(conns, progress=True):
+    """Merges the batches of all workers until every one of them is done.
+    Returns (Aggregate, duration, errors): the duration is the longest
+    worker run, and errors holds the tracebacks of the failed workers."""
+    aggregate = Aggregate()
+    durations = []
+    errors = []
+    pending = list(conns)
+    start = time.perf_counter()
+    last_count, last_time = 0, start
+    while pending:
+        for conn in wait(pending):
+            try:
+                message = conn.recv()
+            except EOFError:
+                errors.append("worker exited without a result")
+                pending.remove(conn)
+                continue
+            if message[0] == "error":
+                errors.append(message[1])
+            else:
+                aggregate.merge(message[1])
+                if message[0] != "done":
+                    continue
+                durations.append(message[2])
+            pending.remove(conn)
+            conn.close()
+        now = time.perf_counter()
+        if progress and now - last_time >= INTERVAL:
+            count = aggregate.requests()
+            print("%6.1f s  %d workers running  %8.1f req/s"
+                  % (now - start, len(pending), (count - last_count) / (now - last_time)))
+            last_count, last_time = count, now
+    return aggregate, max(durations or [0.0]), errors
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run load.py from several processes or nodes")
+    parser.add_argument("-w", "--workers", type=int, default=WORKERS,
+                        help="local worker processes, default %(default)s")
+    parser.add_argument("--listen", metavar="HOST:PORT",
+                        help="coordinate remote nodes instead of local processes")
+    parser.add_argument("--nodes", type=int, default=1, help="remote nodes to wait for")
+    parser.add_argument("--connect", metavar="HOST:PORT",
+                        help="run as a remote node of the coordinator at HOST:PORT")
+    parser.add_argument("--authkey", default=AUTHKEY,
+                        help="shared secret of the coordinator and the nodes, default "
+                             "$REQRES_AUTHKEY; --listen makes one up without it")
+    parser.add_argument("-d", "--duration", type=float, default=DURATION, help="seconds")
+    parser.add_argument("-c", "--concurrency", type=int, default=CONCURRENCY,
+                        help="scenarios in flight per worker")
+    parser.add_argument("-r", "--rps", type=float, help="target scenarios per second per worker")
+    parser.add_argument("-m", "--mix", help="weighted scenarios, e.g. user_data=5,user_login=2")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--interval", type=float, default=INTERVAL,
+                        help="seconds between sample batches of a worker")
+    parser.add_argument("--base-url", default=async_client.BASE_URL,
+                        help="API root, default %(default)s")
+    parser.add_argument("--mock", action="store_true",
+                        help="start mock_server.py in the background and load it, "
+                             "local workers only")
+    args = parser.parse_args(argv)
+
+    if args.connect:
+        if not args.authkey:
+            parser.error("--connect needs the coordinator's --authkey or REQRES_AUTHKEY")
+        serve_node(parse_address(args.connect), args.authkey.encode())
+        return 0
+    if args.mock and args.listen:
+        parser.error("--mock serves on 127.0.0.1 of this machine only, "
+                     "start mock_server.py where the nodes reach it and pass --base-url")
+    try:
+        parse_mix(args.mix)
+    except ValueError as error:
+        parser.error(str(error))
+    server = None
+    if args.mock:
+        from mock_server import MockServer
+        server = MockServer().start()
+        args.base_url = server.base_url
+    job = {"base_url": args.base_url, "mix": args.mix, "duration": args.duration,
+           "concurrency": args.concurrency, "rps": args.rps, "seed": args.seed,
+           "interval": args.interval}
+    if args.listen:
+        if not args.authkey:
+            args.authkey = secrets.token_hex(16)
+            print("no --authkey, start the nodes with REQRES_AUTHKEY=%s" % args.authkey)
+        conns = accept_nodes(parse_address(args.listen), args.nodes, job, args.authkey.encode())
+    else:
+        conns = start_local(job, args.workers)
+    aggregate, duration, errors = coordinate(conns)
+    if server is not None:
+        server.stop()
+
+    for error in errors:
+        print("worker failed:\n" + error)
+    print_load_report(aggregate.report(duration), duration)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
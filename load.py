@@ -0,0 +1,230 @@
+import argparse
+import asyncio
+import math
+import random
+import time
+
+import async_client
+import config
+import metrics
+import results
+import validation_pool
+from scenarios import SCENARIOS
+
+DURATION = 30       # seconds
+CONCURRENCY = 10    # in-flight scenarios
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return 0.0
+    rank = max(int(math.ceil(p / 100.0 * len(values))), 1)
+    return values[rank - 1]
+
+
+def endpoint(scenario):
+    return "%s %s" % (scenario.method, scenario.uri.split("?")[0])
+
+
+def parse_mix(text, scenarios=SCENARIOS):
+    """'user_data=5,user_login=2' -> [(scenario, weight), ...].
+    Without a mix every scenario except the background ones gets weight 1."""
+    by_name = {scenario.name: scenario for scenario in scenarios}
+    if not text:
+        return [(scenario, 1) for scenario in scenarios if not scenario.background]
+    mix = []
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name not in by_name:
+            raise ValueError("Unknown scenario: %s" % name)
+        mix.append((by_name[name], float(weight or 1)))
+    return mix
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def add(self, key, seconds, ok):
+        self.latencies.setdefault(key, []).append(seconds)
+        if not ok:
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    def report(self, duration):
+        rows = []
+        for key in sorted(self.latencies):
+            values = sorted(self.latencies[key])
+            rows.append({
+                "endpoint": key,
+                "requests": len(values),
+                "errors": self.errors.get(key, 0),
+                "rps": len(values) / duration if duration else 0.0,
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "max": values[-1],
+            })
+        return rows
+
+
+def print_load_report(rows, duration):
+    print("%-28s %8s %7s %8s %8s %8s %8s %8s" % (
+        "endpoint", "requests", "errors", "rps", "p50 ms", "p95 ms", "p99 ms", "max ms"))
+    for row in rows:
+        print("%-28s %8d %7d %8.1f %8.1f %8.1f %8.1f %8.1f" % (
+            row["endpoint"], row["requests"], row["errors"], row["rps"],
+            row["p50"] * 1000, row["p95"] * 1000, row["p99"] * 1000, row["max"] * 1000))
+    total = sum(row["requests"] for row in rows)
+    errors = sum(row["errors"] for row in rows)
+    print("total: %d requests, %d errors in %.1f s, %.1f req/s"
+          % (total, errors, duration, total / duration if duration else 0.0))
+
+
+async def run_one(scenario, stats):
+    start = time.perf_counter()
+    try:
+        await scenario.run_async()
+        ok = True
+    except Exception:
+        ok = False
+    stats.add(endpoint(scenario), time.perf_counter() - start, ok)
+
+
+async def run_load(mix, duration=DURATION, concurrency=CONCURRENCY, rps=None, seed=None,
+                   stats=None):
+    """Replays the weighted scenario mix for `duration` seconds.
+
+    Without `rps` it keeps `concurrency` scenarios in flight all the time
+    (closed loop). With `rps` it starts scenarios at that rate, never having
+    more than `concurrency` of them in flight (open loop).
+    `stats` collects the samples, a new LoadStats by default.
+    Returns (stats, measured duration).
+    """
+    rng = random.Random(seed)
+    scenarios = [scenario for scenario, weight in mix]
+    weights = [weight for scenario, weight in mix]
+    if stats is None:
+        stats = LoadStats()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    if rps is None:
+        async def worker():
+            while time.perf_counter() < deadline:
+                await run_one(rng.choices(scenarios, weights)[0], stats)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    else:
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = set()
+
+        async def bounded(scenario):
+            try:
+                await run_one(scenario, stats)
+            finally:
+                semaphore.release()
+
+        interval = 1.0 / rps
+        next_start = start
+        while next_start < deadline:
+            delay = next_start - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await semaphore.acquire()
+            task = asyncio.ensure_future(bounded(rng.choices(scenarios, weights)[0]))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            next_start += interval
+        await asyncio.gather(*tasks)
+
+    elapsed = time.perf_counter() - start
+    await async_client.get_client().close()
+    return stats, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay reqres scenarios as load")
+    parser.add_argument("-d", "--duration", type=float, default=DURATION, help="seconds")
+    parser.add_argument("-c", "--concurrency", type=int, default=CONCURRENCY,
+                        help="scenarios in flight")
+    parser.add_argument("-r", "--rps", type=float, help="target scenarios per second")
+    parser.add_argument("-m", "--mix", help="weighted scenarios, e.g. user_data=5,user_login=2")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--base-url", default=async_client.BASE_URL,
+                        help="API root, default %(default)s")
+    parser.add_argument("--mock", action="store_true",
+                        help="start mock_server.py in the background and load it")
+    parser.add_argument("--cache", action="store_true", default=async_client.CACHE,
+                        help="serve repeated GETs from an in-process cache, see cache.py")
+    parser.add_argument("--single-flight", action="store_true",
+                        default=async_client.SINGLE_FLIGHT,
+                        help="share one call between concurrent identical GETs, "
+                             "see singleflight.py")
+    parser.add_argument("--results", metavar="PATH", default=results.RESULTS,
+                        help="stream one JSONL record per scenario run to PATH, see results.py")
+    parser.add_argument("--schema-workers", type=int, default=0, metavar="N",
+                        help="check schemas in a pool of N workers instead of inline")
+    parser.add_argument("--schema-processes", action="store_true",
+                        help="use processes for --schema-workers")
+    parser.add_argument("--rate", type=float, default=async_client.RATE,
+                        help="pace requests starting at RATE req/s, adapting to 429/5xx, "
+                             "see ratelimit.py")
+    parser.add_argument("--metrics-port", type=int, default=config.METRICS_PORT, metavar="PORT",
+                        help="serve live metrics on 127.0.0.1:PORT/metrics, see metrics.py")
+    parser.add_argument("--metrics-interval", type=float, default=config.METRICS_INTERVAL,
+                        metavar="SECONDS",
+                        help="print the live metrics every SECONDS with --metrics-port, 0 never")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as error:
+        parser.error(str(error))
+    server = None
+    if args.mock:
+        from mock_server import MockServer
+        server = MockServer().start()
+        args.base_url = server.base_url
+    cache = None
+    if args.cache:
+        from cache import ResponseCache
+        cache = ResponseCache()
+    single_flight = None
+    if args.single_flight:
+        from singleflight import SingleFlight
+        single_flight = SingleFlight()
+    if args.results:
+        results.open_writer(args.results)
+    if args.schema_workers:
+        validation_pool.start_pool(args.schema_workers, args.schema_processes)
+    limiter = async_client.limiter_for(args.rate)
+    live = metrics.start(args.metrics_port, args.metrics_interval)
+    async_client.configure(base_url=args.base_url, cache=cache, limiter=limiter, metrics=live,
+                           single_flight=single_flight,
+                           limit_per_host=max(args.concurrency, async_client.LIMIT_PER_HOST))
+    stats, elapsed = asyncio.run(run_load(mix, args.duration, args.concurrency,
+                                          args.rps, args.seed))
+    if live is not None:
+        live.stop()
+    results.close_writer()
+    validation_pool.stop_pool()
+    print_load_report(stats.report(elapsed), elapsed)
+    validation_pool.report.print_report()
+    if cache is not None:
+        from cache import format_stats
+        print(format_stats(cache.stats()))
+    if limiter is not None:
+        from ratelimit import format_stats
+        print(format_stats(limiter.stats()))
+    if single_flight is not None:
+        from singleflight import format_stats
+        print(format_stats(single_flight.stats()))
+    if server is not None:
+        server.stop()
+    return 1 if stats.errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,274 @@
+"""Live metrics of a run in progress.
+
+    python main.py --mock --metrics-port 9100
+    python load.py --mock -d 600 --metrics-port 9100 --metrics-interval 5
+    curl -s 127.0.0.1:9100/metrics
+
+The client reports every request() to Metrics.call(): cache hits and
+limiter waits included, as the scenarios see them. /metrics serves, in
+the Prometheus text format:
+
+    reqres_requests_total{method,endpoint,status}    counter, status "error" for exceptions
+    reqres_request_duration_seconds{method,endpoint,quantile}
+                                                    p50/p95/p99 of the last WINDOW seconds
+    reqres_request_duration_seconds_sum/_count      since the start
+    reqres_requests_in_flight                       gauge
+    reqres_requests_per_second                      over the last RATE_WINDOW seconds
+    reqres_responses_per_second{status}             same, per status
+
+Every `interval` seconds the same numbers are printed to the console;
+there "errors" are the exceptions and the 4xx/5xx answers, expected or not.
+
+The hot path takes no lock: every thread writes its own shard, and only
+the reader merges them. The shard of a finished thread is folded into
+one retired shard, so thread pools that come and go don't pile them up.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import METRICS_INTERVAL as INTERVAL
+from timing import Histogram
+
+SLOT = 1.0          # seconds per rolling histogram
+WINDOW = 30         # seconds of the rolling percentiles
+RATE_WINDOW = 5     # seconds of the current rates
+QUANTILES = (50, 95, 99)
+
+
+class _Shard:
+    """Counters written by one thread only."""
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.started = 0
+        self.finished = 0
+        # (method, endpoint, status) -> [count, seconds]
+        self.totals = {}
+        # slot -> {(method, endpoint, status): Histogram}
+        self.slots = {}
+
+    def add(self, key, seconds):
+        total = self.totals.get(key)
+        if total is None:
+            total = self.totals[key] = [0, 0.0]
+        total[0] += 1
+        total[1] += seconds
+        slot = int(time.time() / SLOT)
+        histograms = self.slots.get(slot)
+        if histograms is None:
+            histograms = self.slots[slot] = {}
+            for old in [old for old in self.slots if old <= slot - WINDOW]:
+                del self.slots[old]
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram()
+        histogram.add(seconds)
+
+    def merge(self, other):
+        self.started += other.started
+        self.finished += other.finished
+        for key, (count, seconds) in list(other.totals.items()):
+            total = self.totals.setdefault(key, [0, 0.0])
+            total[0] += count
+            total[1] += seconds
+        for slot, histograms in list(other.slots.items()):
+            merged = self.slots.setdefault(slot, {})
+            for key, histogram in list(histograms.items()):
+                merged.setdefault(key, Histogram()).merge(histogram)
+
+
+def _endpoint(uri):
+    return uri.split("?")[0]
+
+
+def _labels(**labels):
+    return "{%s}" % ",".join('%s="%s"' % (name, str(value).replace("\\", "\\\\")
+                                          .replace('"', '\\"').replace("\n", "\\n"))
+                             for name, value in labels.items())
+
+
+class Metrics:
+    def __init__(self):
+        self.started_at = time.time()
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard(None)
+        self._lock = threading.Lock()
+        self._server = None
+        self._stop = threading.Event()
+        self._reporter = None
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._retire()
+                self._shards.append(shard)
+        return shard
+
+    def _retire(self):
+        # a dead thread won't write its shard again, so it can be folded safely
+        for shard in [shard for shard in self._shards if not shard.thread.is_alive()]:
+            self._retired.merge(shard)
+            self._shards.remove(shard)
+
+    def call(self, method, uri, send):
+        """send() counted as a request of `method` to `uri`."""
+        shard = self._shard()
+        shard.started += 1
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = send()
+            status = response.status_code
+            return response
+        finally:
+            shard.finished += 1
+            shard.add((method, _endpoint(uri), status), time.perf_counter() - start)
+
+    async def call_async(self, method, uri, send):
+        """call() for a coroutine function."""
+        shard = self._shard()
+        shard.started += 1
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = await send()
+            status = response.status_code
+            return response
+        finally:
+            shard.finished += 1
+            shard.add((method, _endpoint(uri), status), time.perf_counter() - start)
+
+    def merged(self):
+        """All shards merged into one."""
+        merged = _Shard(None)
+        with self._lock:
+            self._retire()
+            merged.merge(self._retired)
+            for shard in self._shards:
+                merged.merge(shard)
+        return merged
+
+    def snapshot(self):
+        """{"in_flight", "rps", "statuses": {status: req/s}, "totals":
+        {(method, endpoint, status): [count, seconds]}, "latency":
+        {(method, endpoint): Histogram of the last WINDOW seconds}}."""
+        merged = self.merged()
+        now = time.time()
+        current = int(now / SLOT)
+        # the current slot is still filling up
+        seconds = now - max((current - RATE_WINDOW + 1) * SLOT, self.started_at) or SLOT
+        statuses = {}
+        latency = {}
+        for slot, histograms in merged.slots.items():
+            if slot <= current - WINDOW:
+                continue
+            for (method, endpoint, status), histogram in histograms.items():
+                latency.setdefault((method, endpoint), Histogram()).merge(histogram)
+                if slot > current - RATE_WINDOW:
+                    statuses[status] = statuses.get(status, 0) + histogram.count
+        statuses = {status: count / seconds for status, count in statuses.items()}
+        return {"in_flight": merged.started - merged.finished, "rps": sum(statuses.values()),
+                "statuses": statuses, "totals": merged.totals, "latency": latency}
+
+    def prometheus(self):
+        snapshot = self.snapshot()
+        lines = ["# TYPE reqres_requests_total counter"]
+        for (method, endpoint, status), (count, _) in sorted(snapshot["totals"].items(), key=str):
+            lines.append("reqres_requests_total%s %d"
+                         % (_labels(method=method, endpoint=endpoint, status=status), count))
+        lines.append("# TYPE reqres_request_duration_seconds summary")
+        sums = {}
+        for (method, endpoint, _), (count, seconds) in snapshot["totals"].items():
+            total = sums.setdefault((method, endpoint), [0, 0.0])
+            total[0] += count
+            total[1] += seconds
+        for (method, endpoint), (count, seconds) in sorted(sums.items()):
+            histogram = snapshot["latency"].get((method, endpoint))
+            for quantile in QUANTILES:
+                value = histogram.percentile(quantile) if histogram is not None else float("nan")
+                lines.append("reqres_request_duration_seconds%s %.6f" % (
+                    _labels(method=method, endpoint=endpoint, quantile=quantile / 100.0), value))
+            labels = _labels(method=method, endpoint=endpoint)
+            lines.append("reqres_request_duration_seconds_sum%s %.6f" % (labels, seconds))
+            lines.append("reqres_request_duration_seconds_count%s %d" % (labels, count))
+        lines += ["# TYPE reqres_requests_in_flight gauge",
+                  "reqres_requests_in_flight %d" % snapshot["in_flight"],
+                  "# TYPE reqres_requests_per_second gauge",
+                  "reqres_requests_per_second %.3f" % snapshot["rps"],
+                  "# TYPE reqres_responses_per_second gauge"]
+        for status, rate in sorted(snapshot["statuses"].items(), key=str):
+            lines.append("reqres_responses_per_second%s %.3f" % (_labels(status=status), rate))
+        return "\n".join(lines) + "\n"
+
+    def summary_lines(self):
+        snapshot = self.snapshot()
+        errors = sum(rate for status, rate in snapshot["statuses"].items()
+                     if status == "error" or status >= 400)
+        lines = ["%6.0f s  %8.1f req/s  in flight %4d  errors %5.1f%%  %s" % (
+            time.time() - self.started_at, snapshot["rps"], snapshot["in_flight"],
+            100.0 * errors / snapshot["rps"] if snapshot["rps"] else 0.0,
+            " ".join("%s: %.1f/s" % item for item in sorted(snapshot["statuses"].items(), key=str)))]
+        for (method, endpoint), histogram in sorted(snapshot["latency"].items()):
+            lines.append("          %-28s %6d  %s ms" % (
+                "%s %s" % (method, endpoint), histogram.count,
+                " ".join("p%d %7.1f" % (quantile, histogram.percentile(quantile) * 1000)
+                         for quantile in QUANTILES)))
+        return lines
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serves /metrics on a background thread."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http",
+                         daemon=True).start()
+        return self
+
+    def report_every(self, interval=INTERVAL):
+        """Prints summary_lines() every `interval` seconds on a background thread."""
+        def report():
+            while not self._stop.wait(interval):
+                print("\n".join(self.summary_lines()), flush=True)
+
+        self._reporter = threading.Thread(target=report, name="metrics-report", daemon=True)
+        self._reporter.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._reporter is not None:
+            self._reporter.join()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def start(port, interval=INTERVAL):
+    """Metrics served on `port` and printed every `interval` seconds
+    (0: not printed), None without a port."""
+    if not port:
+        return None
+    metrics = Metrics().serve(port)
+    if interval:
+        metrics.report_every(interval)
+    return metrics
@@ -0,0 +1,305 @@
+import argparse
+import asyncio
+import functools
+import hashlib
+import itertools
+import json
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlsplit, unquote
+
+HOST = "127.0.0.1"
+PORT = 8000
+MAX_AGE = 14400     # Cache-Control max-age of GET answers, as on reqres.in
+
+SUPPORT = {
+    "url": "https://contentcaddy.io?utm_source=reqres&utm_medium=json&utm_campaign=referral",
+    "text": "Tired of writing endless social media content? Let Content Caddy generate it for you.",
+}
+
+_names = [
+    ("george.bluth", "George", "Bluth"), ("janet.weaver", "Janet", "Weaver"),
+    ("emma.wong", "Emma", "Wong"), ("eve.holt", "Eve", "Holt"),
+    ("charles.morris", "Charles", "Morris"), ("tracey.ramos", "Tracey", "Ramos"),
+    ("michael.lawson", "Michael", "Lawson"), ("lindsay.ferguson", "Lindsay", "Ferguson"),
+    ("tobias.funke", "Tobias", "Funke"), ("byron.fields", "Byron", "Fields"),
+    ("george.edwards", "George", "Edwards"), ("rachel.howell", "Rachel", "Howell"),
+]
+USERS = [{"id": id, "email": login + "@reqres.in", "first_name": first, "last_name": last,
+          "avatar": "https://reqres.in/img/faces/%d-image.jpg" % id}
+         for id, (login, first, last) in enumerate(_names, 1)]
+
+_colors = [
+    ("cerulean", 2000, "#98B2D1", "15-4020"), ("fuchsia rose", 2001, "#C74375", "17-2031"),
+    ("true red", 2002, "#BF1932", "19-1664"), ("aqua sky", 2003, "#7BC4C4", "14-4811"),
+    ("tigerlily", 2004, "#E2583E", "17-1456"), ("blue turquoise", 2005, "#53B0AE", "15-5217"),
+    ("sand dollar", 2006, "#DECDBE", "13-1106"), ("chili pepper", 2007, "#9B1B30", "19-1557"),
+    ("blue iris", 2008, "#5A5B9F", "18-3943"), ("mimosa", 2009, "#F0C05A", "14-0848"),
+    ("turquoise", 2010, "#45B5AA", "15-5519"), ("honeysuckle", 2011, "#D94F70", "18-2120"),
+]
+RESOURCES = [{"id": id, "name": name, "year": year, "color": color, "pantone_value": pantone}
+             for id, (name, year, color, pantone) in enumerate(_colors, 1)]
+
+TOKEN = "QpwL5tke4Pnpja7X4"
+REGISTERED_IDS = {user["email"]: user["id"] for user in USERS}
+_created_ids = itertools.count(100)
+
+REASONS = {200: "OK", 201: "Created", 204: "No Content", 304: "Not Modified", 400: "Bad Request",
+           404: "Not Found", 405: "Method Not Allowed", 429: "Too Many Requests"}
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def first(query, name, default=None):
+    return query.get(name, [default])[0]
+
+
+def page_of(items, query):
+    try:
+        page = int(first(query, "page", 1))
+        per_page = int(first(query, "per_page", 6))
+    except ValueError:
+        page, per_page = 1, 6
+    per_page = max(per_page, 1)
+    start = (page - 1) * per_page
+    return {"page": page, "per_page": per_page, "total": len(items),
+            "total_pages": int(math.ceil(len(items) / float(per_page))),
+            "data": items[start:start + per_page], "support": SUPPORT}
+
+
+def one_of(items, id):
+    for item in items:
+        if str(item["id"]) == id:
+            return 200, {"data": item, "support": SUPPORT}
+    return 404, {}
+
+
+def credentials_error(body):
+    if not (body.get("email") or body.get("username")):
+        return "Missing email or username"
+    if not body.get("password"):
+        return "Missing password"
+    return None
+
+
+def route(method, path, query, body):
+    """Returns (status, json body or None) the way reqres.in answers."""
+    parts = [part for part in path.split("/") if part]
+    if parts[:1] == ["api"]:
+        parts = parts[1:]
+    if not parts:
+        return 404, {}
+    name, id = parts[0], (parts[1] if len(parts) > 1 else None)
+
+    if name == "register" and method == "POST":
+        error = credentials_error(body)
+        if error:
+            return 400, {"error": error}
+        if body.get("email") not in REGISTERED_IDS:
+            return 400, {"error": "Note: Only defined users succeed registration"}
+        return 200, {"id": REGISTERED_IDS[body["email"]], "token": TOKEN}
+
+    if name == "login" and method == "POST":
+        error = credentials_error(body)
+        if error:
+            return 400, {"error": error}
+        if body.get("email") not in REGISTERED_IDS:
+            return 400, {"error": "user not found"}
+        return 200, {"token": TOKEN}
+
+    items = USERS if name == "users" else RESOURCES
+    if method == "GET":
+        return (200, page_of(items, query)) if id is None else one_of(items, id)
+    if method == "POST" and id is None:
+        return 201, dict(body, id=str(next(_created_ids)), createdAt=now())
+    if method in ("PUT", "PATCH") and id is not None:
+        return 200, dict(body, updatedAt=now())
+    if method == "DELETE" and id is not None:
+        return 204, None
+    return 405, {}
+
+
+def parse_body(headers, raw):
+    if not raw:
+        return {}
+    if "json" in headers.get("content-type", ""):
+        try:
+            body = json.loads(raw)
+        except ValueError:
+            return {}
+        return body if isinstance(body, dict) else {}
+    return {key: values[-1] for key, values in
+            parse_qs(raw.decode("utf-8"), keep_blank_values=True).items()}
+
+
+class Throttle:
+    """Allows `rate` requests per one second window, like a rate limited API."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.window = 0
+        self.count = 0
+
+    def retry_after(self):
+        """None when the request may pass, else whole seconds to wait."""
+        now = time.monotonic()
+        window = int(now)
+        if window != self.window:
+            self.window, self.count = window, 0
+        self.count += 1
+        if self.count <= self.rate:
+            return None
+        return max(int(math.ceil(window + 1 - now)), 1)
+
+
+def etag_of(content):
+    return 'W/"%x-%s"' % (len(content), hashlib.sha1(content).hexdigest()[:27])
+
+
+def render(status, body, keep_alive, cacheable=False, if_none_match=None, headers=()):
+    """Raw HTTP response. A cacheable 200 gets an ETag and max-age, and
+    becomes an empty 304 when `if_none_match` names that ETag."""
+    content = b"" if body is None else json.dumps(body, separators=(",", ":")).encode("utf-8")
+    extra = []
+    if cacheable and status == 200:
+        etag = etag_of(content)
+        extra = ["Cache-Control: max-age=%d" % MAX_AGE, "ETag: %s" % etag]
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            status, body, content = 304, None, b""
+    head = ["HTTP/1.1 %d %s" % (status, REASONS.get(status, "Unknown")),
+            "Content-Length: %d" % len(content),
+            "Connection: %s" % ("keep-alive" if keep_alive else "close")] + extra + list(headers)
+    if body is not None:
+        head.append("Content-Type: application/json; charset=utf-8")
+    return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + content
+
+
+async def handle(reader, writer, throttle=None):
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            lines = head.decode("latin-1").split("\r\n")
+            method, target, version = lines[0].split(" ", 2)
+            headers = {}
+            for line in lines[1:]:
+                if ":" in line:
+                    key, value = line.split(":", 1)
+                    headers[key.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0))
+            raw = await reader.readexactly(length) if length else b""
+
+            url = urlsplit(target)
+            query = parse_qs(url.query)
+            delay = first(query, "delay")
+            if delay:
+                await asyncio.sleep(float(delay))
+            wait = throttle.retry_after() if throttle is not None else None
+            if wait is None:
+                status, body = route(method, unquote(url.path), query, parse_body(headers, raw))
+            else:
+                status, body = 429, {"error": "Too many requests"}
+
+            connection = headers.get("connection", "").lower()
+            keep_alive = connection != "close" and (version == "HTTP/1.1" or connection == "keep-alive")
+            writer.write(render(status, body, keep_alive, method == "GET",
+                                headers.get("if-none-match"),
+                                () if wait is None else ["Retry-After: %d" % wait]))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.CancelledError):
+        # client went away or the server is stopping
+        pass
+    finally:
+        writer.close()
+
+
+def handler(rate_limit=None):
+    if not rate_limit:
+        return handle
+    return functools.partial(handle, throttle=Throttle(rate_limit))
+
+
+async def serve(host=HOST, port=PORT, rate_limit=None):
+    server = await asyncio.start_server(handler(rate_limit), host, port, backlog=1024)
+    async with server:
+        await server.serve_forever()
+
+
+class MockServer:
+    """Runs the mock on its own event loop thread, e.g. for a test run:
+
+        with MockServer() as server:
+            client.configure(base_url=server.base_url)
+    """
+
+    def __init__(self, host=HOST, port=0, rate_limit=None):
+        self.host = host
+        self.port = port
+        # requests per second answered before 429 Too Many Requests, None for no limit
+        self.rate_limit = rate_limit
+        self.loop = None
+        self._server = None
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def base_url(self):
+        return "http://%s:%d/api/" % (self.host, self.port)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._server = self.loop.run_until_complete(
+            asyncio.start_server(handler(self.rate_limit), self.host, self.port, backlog=1024))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._started.set()
+        self.loop.run_forever()
+        self._server.close()
+        # close the keep-alive connections that are still open
+        tasks = asyncio.all_tasks(self.loop)
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self.loop.close()
+
+    def start(self):
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the reqres.in API")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("-p", "--port", type=int, default=PORT)
+    parser.add_argument("--rate-limit", type=int,
+                        help="answer 429 with Retry-After past this many requests per second")
+    args = parser.parse_args(argv)
+
+    print("Serving reqres mock on http://%s:%d/api/" % (args.host, args.port))
+    try:
+        asyncio.run(serve(args.host, args.port, args.rate_limit))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Compact record classes generated from the schemas in schemas.py.
+
+    User, Resource, NewUser, UpdateUser, UpdateUserPart
+
+Each class has __slots__ for the schema properties, so an instance takes
+a fraction of the memory of the equivalent dict and attribute access is
+faster than a dict lookup. decode_records() checks a response body
+against the schema and yields these records; decoders.decode_typed()
+uses msgspec Structs instead when msgspec is installed.
+"""
+import tracemalloc
+
+import schemas
+
+_models = {}
+
+
+class Record:
+    __slots__ = ()
+    _required = ()
+    _schema = None
+
+    def __init__(self, **fields):
+        missing = [name for name in self._required if name not in fields]
+        if missing:
+            raise TypeError("%s is missing %s" % (type(self).__name__, ", ".join(missing)))
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_dict(cls, data):
+        """Record from a decoded JSON object, unknown keys are dropped."""
+        record = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(record, name, data.get(name))
+        return record
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other):
+        return type(other) is type(self) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__, ", ".join(
+            "%s=%r" % (name, getattr(self, name)) for name in self.__slots__))
+
+
+def model_name(schema):
+    for name, value in vars(schemas).items():
+        if value is schema and name.startswith("schema_"):
+            return "".join(part.title() for part in name.split("_")[1:])
+    return "Record"
+
+
+def model_for(schema):
+    """__slots__ record class for an object schema, generated once per schema."""
+    model = _models.get(id(schema))
+    if model is None or model._schema is not schema:
+        model = type(model_name(schema), (Record,), {
+            "__slots__": tuple(schema.get("properties", {})),
+            "_required": tuple(schema.get("required", ())),
+            "_schema": schema,
+        })
+        _models[id(schema)] = model
+    return model
+
+
+User = model_for(schemas.schema_user)
+Resource = model_for(schemas.schema_resource)
+NewUser = model_for(schemas.schema_new_user)
+UpdateUser = model_for(schemas.schema_update_user)
+UpdateUserPart = model_for(schemas.schema_update_user_part)
+
+
+def decode_records(content, schema, envelope="data"):
+    """Records of body[envelope] (a list or one object), each checked
+    against `schema`; a jsonschema ValidationError stops the decoding."""
+    from decoders import loads
+    from validators import validate
+
+    model = model_for(schema)
+    body = loads(content)
+    value = body[envelope] if envelope else body
+    for item in (value if isinstance(value, list) else [value]):
+        validate(item, schema)
+        yield model.from_dict(item)
+
+
+def _allocated(build):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = build()
+    size = sum(stat.size_diff for stat in
+               tracemalloc.take_snapshot().compare_to(before, "filename"))
+    tracemalloc.stop()
+    return size, kept
+
+
+def memory_report(count=100000):
+    """Memory of `count` users as dicts, records and (if installed) msgspec Structs."""
+    user = {"id": 2, "email": "janet.weaver@reqres.in", "first_name": "Janet",
+            "last_name": "Weaver", "avatar": "https://reqres.in/img/faces/2-image.jpg"}
+    builders = {"dict": lambda: [dict(user) for _ in range(count)],
+                "slots record": lambda: [User.from_dict(user) for _ in range(count)]}
+    try:
+        from decoders import struct_for
+        struct = struct_for(schemas.schema_user)
+        builders["msgspec Struct"] = lambda: [struct(**user) for _ in range(count)]
+    except ImportError:
+        pass
+    for name, build in builders.items():
+        size, kept = _allocated(build)
+        print("%-15s %8.1f bytes per user" % (name, size / float(count)))
+        del kept
+
+
+if __name__ == "__main__":
+    memory_report()
@@ -0,0 +1,100 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from jsonschema.exceptions import best_match
+
+import decoders
+import schemas
+from client import send_request
+from validators import get_validator
+
+PER_PAGE = 6
+
+
+def default_schema(collection):
+    return schemas.schema_user if collection == "users" else schemas.schema_resource
+
+
+def page_uri(collection, page, per_page):
+    return "%s?page=%d&per_page=%d" % (collection, page, per_page)
+
+
+def fetch_page(collection, page, per_page):
+    response = send_request("GET", page_uri(collection, page, per_page))
+    assert response.status_code == 200, "Error code should be 200"
+    return response.content
+
+
+def check_item(validator, item):
+    error = best_match(validator.iter_errors(item))
+    if error is not None:
+        raise error
+    return item
+
+
+class PageReader:
+    """Turns the raw body of a listing page into (items, total_pages)."""
+
+    def __init__(self, collection, schema=None, validate=True, typed=False):
+        self.schema = schema or default_schema(collection)
+        self.typed = typed
+        self.validator = get_validator(self.schema) if validate and not typed else None
+
+    def read(self, content):
+        if self.typed:
+            return decoders.decode_page(content, self.schema)
+        body = decoders.loads(content)
+        items = body["data"]
+        if self.validator is not None:
+            items = (check_item(self.validator, item) for item in items)
+        return items, body.get("total_pages", 1)
+
+
+def paginate(collection="users", per_page=PER_PAGE, schema=None, validate=True, typed=False):
+    """Yields the records of a users/{resource} listing one by one.
+
+    Page N+1 is fetched in the background while page N is consumed, and
+    the walk stops at `total_pages`. Only these two pages are held in
+    memory. Every record is checked against `schema` (schema_user for
+    users, schema_resource otherwise) and a jsonschema ValidationError is
+    raised for the first invalid one. With `typed` the records are Structs
+    from decoders.decode_page, checked while decoding.
+    """
+    reader = PageReader(collection, schema, validate, typed)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        page = 1
+        pending = pool.submit(fetch_page, collection, page, per_page)
+        while pending is not None:
+            items, total_pages = reader.read(pending.result())
+            pending = None
+            if page < total_pages:
+                pending = pool.submit(fetch_page, collection, page + 1, per_page)
+            yield from items
+            page += 1
+
+
+async def fetch_page_async(collection, page, per_page):
+    from async_client import send_request as send_request_async
+    response = await send_request_async("GET", page_uri(collection, page, per_page))
+    assert response.status_code == 200, "Error code should be 200"
+    return response.content
+
+
+async def paginate_async(collection="users", per_page=PER_PAGE, schema=None, validate=True,
+                         typed=False):
+    """Async generator version of paginate() on the aiohttp client."""
+    reader = PageReader(collection, schema, validate, typed)
+    page = 1
+    pending = asyncio.ensure_future(fetch_page_async(collection, page, per_page))
+    try:
+        while pending is not None:
+            items, total_pages = reader.read(await pending)
+            pending = None
+            if page < total_pages:
+                pending = asyncio.ensure_future(fetch_page_async(collection, page + 1, per_page))
+            for item in items:
+                yield item
+            page += 1
+    finally:
+        if pending is not None:
+            pending.cancel()
@@ -0,0 +1,205 @@
+"""Where the time of a scenario goes on the client side.
+
+    python main.py --mock --profile profiles/
+    python main.py --mock --profile profiles/ --profile-interval 0.0005
+
+Every scenario run on the sync engine is sampled: a background thread
+records the Python stack of the scenario's thread every `interval`
+seconds. Each stack is attributed to one phase:
+
+    build       requests preparing the request (URL, headers, body)
+    network     blocked in socket, ssl or select: DNS, connect, send, server time
+    client      the rest of requests/urllib3/http.client, e.g. parsing the answer
+    decode      response.json() / decoders.py
+    validate    jsonschema checks
+    assert      the scenario's own checks
+    other       everything else
+
+A 10 ms scenario gives only a handful of samples per run; the profiles
+of repeated runs add up, and --profile-interval samples more often. While
+profiling, sys.setswitchinterval() is lowered to the sampling interval so
+a CPU-bound scenario can't keep the sampler off the GIL.
+
+CPU time is measured with time.thread_time(). Wait time is wall time
+minus CPU time: it covers the network and the GIL waits. The summary table
+shows both, with the share of samples per phase.
+
+profiles/<scenario>.folded and profiles/all.folded hold collapsed stacks
+("frame;frame;frame count"). flamegraph.pl, speedscope or inferno turn
+them into flamegraphs.
+"""
+import os
+import sys
+import threading
+import time
+
+INTERVAL = 0.001    # seconds between two samples
+PHASES = ("build", "network", "client", "decode", "validate", "assert", "other")
+
+_NETWORK_FILES = ("socket.py", "ssl.py", "selectors.py")
+_DECODE_DIRS = (os.sep + "json" + os.sep, os.sep + "orjson", os.sep + "msgspec")
+_VALIDATE_DIRS = (os.sep + "jsonschema" + os.sep,)
+_VALIDATE_FILES = ("validators.py", "validation_pool.py")
+_CLIENT_DIRS = (os.sep + "requests" + os.sep, os.sep + "urllib3" + os.sep,
+                os.sep + "http" + os.sep)
+
+
+_modules = {}
+
+
+def module_name(filename):
+    """Dotted module of a source file, e.g. http.client rather than client.py."""
+    name = _modules.get(filename)
+    if name is None:
+        name = filename
+        for path in sorted(filter(None, sys.path), key=len, reverse=True):
+            if filename.startswith(path + os.sep):
+                name = os.path.splitext(filename[len(path) + 1:])[0].replace(os.sep, ".")
+                break
+        _modules[filename] = name
+    return name
+
+
+def classify(stack):
+    """Phase of a stack of (filename, function) pairs, root first."""
+    filename = stack[-1][0] if stack else ""
+    if os.path.basename(filename) in _NETWORK_FILES:
+        return "network"
+    for filename, function in reversed(stack):
+        name = os.path.basename(filename)
+        function = function.rpartition(".")[2]
+        if name == "decoders.py" or any(part in filename for part in _DECODE_DIRS):
+            return "decode"
+        if name in _VALIDATE_FILES or any(part in filename for part in _VALIDATE_DIRS):
+            return "validate"
+        if function in ("prepare", "prepare_request") and os.sep + "requests" + os.sep in filename:
+            return "build"
+        if name == "scenarios.py" and function == "check":
+            return "assert"
+    if any(part in filename for filename, _ in stack for part in _CLIENT_DIRS):
+        return "client"
+    return "other"
+
+
+class ScenarioProfile:
+    def __init__(self, name):
+        self.name = name
+        self.runs = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.stacks = {}
+        self.phases = dict.fromkeys(PHASES, 0)
+
+    @property
+    def samples(self):
+        return sum(self.phases.values())
+
+    def add(self, stack):
+        labels = tuple("%s:%s" % (module_name(filename), function) for filename, function in stack)
+        self.stacks[labels] = self.stacks.get(labels, 0) + 1
+        self.phases[classify(stack)] += 1
+
+    def folded(self, root=None):
+        prefix = (root,) if root else ()
+        return ["%s %d" % (";".join(prefix + labels), count)
+                for labels, count in sorted(self.stacks.items())]
+
+
+class Profiler:
+    """Samples the threads that are inside run()."""
+
+    def __init__(self, interval=INTERVAL):
+        self.interval = interval
+        self.profiles = {}
+        self._active = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._switch_interval = None
+
+    def start(self):
+        # the sampler needs the GIL; by default a busy thread hands it over every 5 ms only
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self.interval, self._switch_interval))
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            sys.setswitchinterval(self._switch_interval)
+
+    def run(self, name, func):
+        """func() profiled as scenario `name`; returns what func returns."""
+        with self._lock:
+            profile = self.profiles.get(name)
+            if profile is None:
+                profile = self.profiles[name] = ScenarioProfile(name)
+        ident = threading.get_ident()
+        self._active[ident] = profile
+        start, cpu = time.perf_counter(), time.thread_time()
+        try:
+            return func()
+        finally:
+            del self._active[ident]
+            with self._lock:
+                profile.runs += 1
+                profile.cpu += time.thread_time() - cpu
+                profile.wall += time.perf_counter() - start
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None and frame.f_code is not _RUN_CODE:
+            stack.append((frame.f_code.co_filename,
+                          getattr(frame.f_code, "co_qualname", frame.f_code.co_name)))
+            frame = frame.f_back
+        # frames above run() belong to the runner
+        stack.reverse()
+        return stack
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident, profile in list(self._active.items()):
+                frame = frames.get(ident)
+                if frame is not None:
+                    stack = self._stack(frame)
+                    with self._lock:
+                        profile.add(stack)
+
+    def dump(self, directory):
+        """<scenario>.folded per scenario and all.folded with the scenario as root."""
+        os.makedirs(directory, exist_ok=True)
+        everything = []
+        for name, profile in sorted(self.profiles.items()):
+            with open(os.path.join(directory, name + ".folded"), "w") as file:
+                file.write("\n".join(profile.folded()) + "\n")
+            everything += profile.folded(root=name)
+        with open(os.path.join(directory, "all.folded"), "w") as file:
+            file.write("\n".join(everything) + "\n")
+
+    def rows(self):
+        rows = []
+        for name, profile in sorted(self.profiles.items()):
+            samples = profile.samples or 1
+            row = {"scenario": name, "runs": profile.runs, "wall": profile.wall,
+                   "cpu": profile.cpu, "wait": max(profile.wall - profile.cpu, 0.0),
+                   "samples": profile.samples}
+            row.update((phase, profile.phases[phase] / float(samples)) for phase in PHASES)
+            rows.append(row)
+        return rows
+
+    def print_summary(self):
+        print("%-36s %8s %8s %8s %5s %7s  %s" % (
+            "scenario", "wall ms", "cpu ms", "wait ms", "cpu%", "samples",
+            " ".join("%8s" % phase for phase in PHASES)))
+        for row in self.rows():
+            print("%-36s %8.1f %8.1f %8.1f %4.0f%% %7d  %s" % (
+                row["scenario"], row["wall"] * 1000, row["cpu"] * 1000, row["wait"] * 1000,
+                100.0 * row["cpu"] / row["wall"] if row["wall"] else 0.0, row["samples"],
+                " ".join("%7.0f%%" % (row[phase] * 100) for phase in PHASES)))
+
+
+_RUN_CODE = Profiler.run.__code__
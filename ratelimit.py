@@ -0,0 +1,202 @@
+"""Client-side pacing that adapts to 429/5xx answers.
+
+    REQRES_RATE=20 python main.py
+    python load.py --rate 50 -c 20
+    client.configure(limiter=AdaptiveLimiter(rate=20))
+
+Every request takes a token from a token bucket refilled at `rate`
+requests per second. The rate follows AIMD:
+- A successful answer adds `increase` req/s per second of traffic.
+- A 429 or 5xx multiplies the rate by `decrease`, at most once per
+  window of requests already in flight.
+A Retry-After header pauses all requests until that time. The answers
+listed in `retry_statuses` are retried up to `retries` times, waiting for
+Retry-After or `backoff` seconds. The rate stays between `min_rate` and
+`max_rate`.
+"""
+import asyncio
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+RATE = 10.0         # requests per second to start with
+MIN_RATE = 0.5
+MAX_RATE = 1000.0
+BURST = 10          # requests that may go out at once after an idle period
+INCREASE = 1.0      # req/s added per second of successful requests
+DECREASE = 0.5      # rate multiplier on a 429/5xx answer
+RETRIES = 3
+BACKOFF = 1.0       # seconds to pause before a retry without Retry-After
+MAX_PAUSE = 60.0    # longest Retry-After taken into account
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+def retry_after(headers):
+    """Seconds from a Retry-After header (delay or HTTP date), None without one."""
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_PAUSE)
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now):
+        """Takes one token; seconds to wait before it may be used."""
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def set_rate(self, rate, now):
+        self._refill(now)
+        self.rate = rate
+
+
+class AdaptiveLimiter:
+    """Token bucket with an AIMD rate, shared by the threads or tasks of one client."""
+
+    def __init__(self, rate=RATE, min_rate=MIN_RATE, max_rate=MAX_RATE, burst=BURST,
+                 increase=INCREASE, decrease=DECREASE, retries=RETRIES, backoff=BACKOFF,
+                 retry_statuses=RETRY_STATUSES):
+        self.bucket = TokenBucket(rate, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.retries = retries
+        self.backoff = backoff
+        self.retry_statuses = retry_statuses
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._decreased_at = 0.0
+        self._throttled_until = 0.0
+        # metrics: wall time with at least one request waiting, and the
+        # waits of all requests added up
+        self.throttled_seconds = 0.0
+        self.waited_seconds = 0.0
+        self.waits = 0
+        self.backoffs = 0
+        self.retried = 0
+        self.lowest_rate = self.highest_rate = rate
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def delay(self):
+        """Seconds the next request has to wait; the wait is counted as throttled."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self.bucket.reserve(now), self._paused_until - now, 0.0)
+            if wait:
+                self._throttle(now, wait)
+                self.waits += 1
+            return wait
+
+    def paused(self):
+        """Seconds left of a Retry-After pause, counted as throttled."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self._paused_until - now, 0.0)
+            if wait:
+                self._throttle(now, wait)
+            return wait
+
+    def _throttle(self, now, wait):
+        # waits start in time order, so only the part past the last one is new wall time
+        self.throttled_seconds += max(now + wait - max(now, self._throttled_until), 0.0)
+        self._throttled_until = max(self._throttled_until, now + wait)
+        self.waited_seconds += wait
+
+    def update(self, status, headers, scheduled_at):
+        """Feeds back the answer of a request that took its token at
+        `scheduled_at` (monotonic). Returns True when it should be retried."""
+        with self._lock:
+            now = time.monotonic()
+            if status != 429 and status < 500:
+                rate = min(self.rate + self.increase / self.rate, self.max_rate)
+                self.bucket.set_rate(rate, now)
+                self.highest_rate = max(self.highest_rate, rate)
+                return False
+            self.backoffs += 1
+            # requests scheduled before the last decrease ran at the old rate,
+            # their answers must not decrease it again
+            if scheduled_at >= self._decreased_at:
+                rate = max(self.rate * self.decrease, self.min_rate)
+                self.bucket.set_rate(rate, now)
+                self.lowest_rate = min(self.lowest_rate, rate)
+                self._decreased_at = now
+            retry = status in self.retry_statuses
+            pause = retry_after(headers)
+            if pause is None and retry:
+                pause = self.backoff
+            if pause:
+                self._paused_until = max(self._paused_until, now + pause)
+            return retry
+
+    def _give_up(self, attempt, retry):
+        if retry and attempt < self.retries:
+            with self._lock:
+                self.retried += 1
+            return False
+        return True
+
+    def call(self, send):
+        """send() -> response, paced and retried."""
+        attempt = 0
+        while True:
+            scheduled_at = time.monotonic()
+            wait = self.delay()
+            while wait:
+                time.sleep(wait)
+                wait = self.paused()
+            response = send()
+            retry = self.update(response.status_code, response.headers, scheduled_at)
+            if self._give_up(attempt, retry):
+                return response
+            attempt += 1
+
+    async def call_async(self, send):
+        """Async call(): `send` returns an awaitable."""
+        attempt = 0
+        while True:
+            scheduled_at = time.monotonic()
+            wait = self.delay()
+            while wait:
+                await asyncio.sleep(wait)
+                wait = self.paused()
+            response = await send()
+            retry = self.update(response.status_code, response.headers, scheduled_at)
+            if self._give_up(attempt, retry):
+                return response
+            attempt += 1
+
+    def stats(self):
+        with self._lock:
+            return {"rate": self.rate, "lowest_rate": self.lowest_rate,
+                    "highest_rate": self.highest_rate,
+                    "throttled_seconds": self.throttled_seconds,
+                    "waited_seconds": self.waited_seconds, "waits": self.waits,
+                    "backoffs": self.backoffs, "retried": self.retried}
+
+
+def format_stats(stats):
+    return ("rate limit: {rate:.1f} req/s now ({lowest_rate:.1f}..{highest_rate:.1f}), "
+            "{throttled_seconds:.2f} s throttled ({waited_seconds:.2f} s summed over {waits} waits), "
+            "{backoffs} backoffs, {retried} retried".format(**stats))
@@ -0,0 +1,140 @@
+"""Latency budgets for the reqres scenarios.
+
+    python reqres_bench.py --mock --save bench_baseline.json
+    python reqres_bench.py --mock --compare bench_baseline.json --threshold 0.2
+
+Every scenario runs `warmup` times unmeasured, then `iterations` times
+measured. --compare exits with 1 when the median or p95 of any scenario
+is more than `threshold` (relative) and `min_delta` (absolute) slower
+than in the baseline.
+"""
+import argparse
+import json
+import platform
+import socket
+import statistics
+import sys
+import time
+
+import client
+from load import percentile
+from scenarios import SCENARIOS, select
+
+BENCHMARKS = ["full_users_list", "user_data", "user_login", "register_new_user"]
+WARMUP = 5
+ITERATIONS = 50
+THRESHOLD = 0.2
+MIN_DELTA = 0.002   # seconds, slowdowns below this are noise, not regressions
+
+
+def environment(base_url):
+    return {"target": base_url, "python": platform.python_version(),
+            "machine": "%s %s" % (platform.system(), platform.machine()),
+            "host": socket.gethostname(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def bench_scenario(scenario, warmup=WARMUP, iterations=ITERATIONS):
+    for _ in range(warmup):
+        scenario.run()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        scenario.run()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {"iterations": iterations, "min": samples[0], "median": statistics.median(samples),
+            "p95": percentile(samples, 95), "max": samples[-1],
+            "mean": statistics.mean(samples)}
+
+
+def run_benchmarks(names=BENCHMARKS, warmup=WARMUP, iterations=ITERATIONS):
+    by_name = {scenario.name: scenario for scenario in SCENARIOS}
+    return {name: bench_scenario(by_name[name], warmup, iterations) for name in names}
+
+
+def compare(results, baseline, threshold=THRESHOLD, min_delta=MIN_DELTA):
+    """List of regressions: (scenario, metric, baseline seconds, current seconds)."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        for metric in ("median", "p95"):
+            if (current[metric] > previous[metric] * (1 + threshold)
+                    and current[metric] - previous[metric] > min_delta):
+                regressions.append((name, metric, previous[metric], current[metric]))
+    return regressions
+
+
+def print_results(results, baseline=None):
+    print("%-22s %10s %10s %10s %10s" % ("scenario", "median ms", "p95 ms",
+                                         "base med", "base p95"))
+    for name, result in results.items():
+        previous = (baseline or {}).get("results", {}).get(name, {})
+        print("%-22s %10.2f %10.2f %10s %10s" % (
+            name, result["median"] * 1000, result["p95"] * 1000,
+            "%.2f" % (previous["median"] * 1000) if previous else "-",
+            "%.2f" % (previous["p95"] * 1000) if previous else "-"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the reqres scenarios")
+    parser.add_argument("-s", "--scenario", action="append", dest="scenarios",
+                        help="scenario name, repeatable, default %s" % ",".join(BENCHMARKS))
+    parser.add_argument("-n", "--iterations", type=int, default=ITERATIONS)
+    parser.add_argument("--warmup", type=int, default=WARMUP)
+    parser.add_argument("--base-url", default=client.BASE_URL,
+                        help="API root, default %(default)s")
+    parser.add_argument("--mock", action="store_true",
+                        help="benchmark mock_server.py started in the background")
+    parser.add_argument("--save", metavar="PATH", help="write the results as the new baseline")
+    parser.add_argument("--compare", metavar="PATH", help="baseline to check the results against")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="allowed relative slowdown, default %(default)s")
+    parser.add_argument("--min-delta", type=float, default=MIN_DELTA,
+                        help="allowed absolute slowdown in seconds, default %(default)s")
+    args = parser.parse_args(argv)
+    try:
+        select(args.scenarios)
+    except ValueError as error:
+        parser.error(str(error))
+
+    server = None
+    if args.mock:
+        from mock_server import MockServer
+        server = MockServer().start()
+        args.base_url = server.base_url
+    client.configure(base_url=args.base_url)
+
+    results = run_benchmarks(args.scenarios or BENCHMARKS, args.warmup, args.iterations)
+    # the mock gets a new port every run
+    env = environment("mock_server.py" if args.mock else args.base_url)
+    if server is not None:
+        server.stop()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump({"environment": env, "results": results}, file, indent=2)
+
+    if baseline is None:
+        return 0
+    for key in ("target", "machine", "python"):
+        if baseline["environment"].get(key) != env[key]:
+            print("warning: baseline %s is %r, this run %r"
+                  % (key, baseline["environment"].get(key), env[key]))
+    regressions = compare(results, baseline, args.threshold, args.min_delta)
+    for name, metric, previous, current in regressions:
+        print("REGRESSION %s %s: %.2f ms -> %.2f ms (+%.0f%%)" % (
+            name, metric, previous * 1000, current * 1000, (current / previous - 1) * 100))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
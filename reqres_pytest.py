@@ -1,309 +1,323 @@
-import requests
-from jsonschema import validate
-import schemas
-from datetime import datetime
-
-def send_request(type, uri, data = {}, headers = {}):
-    url = "https://reqres.in/api/"+uri
-    response = requests.request(type, url, headers=headers, data=data)
-    return response
-
-def test_full_users_list():
-    url = "users?page=1&per_page=12"
-    response = send_request("GET", url)
-    response_dict = response.json()
-
-    assert len(response_dict['data']) == 12, "List should contain all the values"
-    assert response.status_code == 200, "Error code should be 200"
-
-def test_part_of_the_users_list():
-    url = "users?page=2&per_page=2"
-    response = send_request("GET", url)
-    response_dict = response.json()
-
-    assert response.status_code == 200, "Error code should be 200"
-    assert response_dict['data'][0]['id'] == 3 and response_dict['data'][1]['id'] == 4, "Response should return users with id's 3 and 4"
-    assert len(response_dict['data']) == 2, "List should contain all the values"
-
-def test_user_data():
-    url = "users/2"
-    response = send_request("GET", url)
-    response_dict = response.json()
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-    assert response.status_code == 200, "Error code should be 200"
-    assert response_dict['data']['id'] == 2, "Response should return user with id = 2"
+import pytest
 
-    #Check JSON schema
+import results
+import scenarios
+import schemas
+from async_client import AsyncClient
+from cache import ResponseCache
+from cassette import FOOTER, MAGIC, Player, Recorder
+from client import Client, get_client, send_batch
+from decoders import decode_page, decode_typed
+from distributed import Aggregate, HistogramStats
+from metrics import Metrics
+from mock_server import MockServer
+from models import decode_records
+from paginator import paginate
+from ratelimit import AdaptiveLimiter
+from singleflight import SingleFlight
+
+#Сценарии для записи и воспроизведения кассет: без задержек и без общего состояния
+RECORDED = ("full_users_list", "user_data", "user_data_with_id_13", "user_login",
+            "not_existing_user_login")
+#Порт 9 (discard) закрыт: при воспроизведении запросы не должны уходить в сеть
+OFFLINE_URL = "http://127.0.0.1:9/api/"
+
+#Тесты строятся из таблицы сценариев в scenarios.py: test_<имя сценария>
+for _scenario in scenarios.SCENARIOS:
+    globals()["test_" + _scenario.name] = _scenario.as_test(__name__)
+
+
+def test_users_pagination():
+    ids = [user['id'] for user in paginate("users", per_page=5)]
+
+    assert len(ids) == 12, "Pages should contain all the users"
+    assert len(set(ids)) == len(ids), "Pages should not repeat users"
+
+
+def test_cached_user_data():
+    cached = Client(base_url=get_client().base_url, cache=ResponseCache())
     try:
-        validate(response_dict['data'], schemas.schema_user)
-    except:
-        print("Incorrect output for User, check JSON schema")
-
-def test_user_data_with_invalid_id():
-    url = "users/0"
-    response = send_request("GET", url)
-    response_dict = response.json()
-
-    assert len(response_dict) == 0, "Request should return empty JSON file"
-    assert response.status_code == 404, "Error code for non-existent User should be 404"
-
-    url = "users/13"
-    response = send_request("GET", url)
-    response_dict = response.json()
-
-    assert len(response_dict) == 0, "Request should return empty JSON file"
-    assert response.status_code == 404, "Error code for non-existent User should be 404"
-
-def test_resources_list():
-    url = "{resource}?page=1&per_page=12"
-    response = send_request("GET", url)
-    response_dict = response.json()
-
-    assert len(response_dict['data']) == 12, "List should contain all the values"
-    assert response.status_code == 200, "Error code should be 200"
+        first = cached.request("GET", "users/2")
+        second = cached.request("GET", "users/2")
+    finally:
+        cached.close()
 
-def get_part_of_the_resources_list():
-    url = "{resource}?page=2&per_page=2"
-    response = send_request("GET", url)
-    response_dict = response.json()
+    assert not getattr(first, "from_cache", False), "First request should go to the server"
+    assert second.from_cache, "Repeated request should be served from the cache"
+    assert second.json() == first.json(), "Cached response should have the same body"
+    assert cached.requests_sent == 1, "Only one request should be sent"
 
-    assert response.status_code == 200, "Error code should be 200"
-    assert response_dict['data'][0]['id'] == 3 and response_dict['data'][1]['id'] == 4, "Response should return users with id's 3 and 4"
-    assert len(response_dict['data']) == 2, "List should contain all the values"
 
-def test_get_one_resource_data():
-    url = "{resource}/4"
-    response = send_request("GET", url)
-    response_dict = response.json()
-
-    assert response.status_code == 200, "Error code should be 200"
-    assert response_dict['data']['id'] == 4, "Response should return user with id = 2"
-
-    #Check JSON schema
+def test_cached_user_update():
+    cached = Client(base_url=get_client().base_url, cache=ResponseCache())
     try:
-        validate(response_dict['data'], schemas.schema_resource)
-    except:
-        print("Incorrect output for Resource, check JSON schema")
-
-def test_resouce_data_with_invalid_id():
-    url = "{resource}/0"
-    response = send_request("GET", url)
-    response_dict = response.json()
-
-    assert len(response_dict) == 0, "Request should return empty JSON file"
-    assert response.status_code == 404, "Error code for non-existent Resource should be 404"
-
-    url = "{resource}/13"
-    response = send_request("GET", url)
-    response_dict = response.json()
-
-    assert len(response_dict) == 0, "Request should return empty JSON file"
-    assert response.status_code == 404, "Error code for non-existent Resource should be 404"
-
-def test_request_delay():
-    start = datetime.utcnow()
-    url = "users?delay=10"
-    response = send_request("GET", url)
-    response_dict = response.json()
-    finish = datetime.utcnow()
-    res = finish-start
-    assert res.seconds == 10, "Delay should be 10 sec"
-    assert response.status_code == 200, "Request successfull"
-
-headers = {}
-
-#POST TESTS
-def test_register_new_user():
-    url = "register"
-    payload = {
-            "email": "eve.holt@reqres.in",
-            "password": "pistol"
-            }
-    response = send_request("POST", url, payload)
-    response_dict = response.json()
-
-    assert ('id' in response_dict.keys() and 'token' in response_dict.keys()) == True, "Output should contain id and token values"
-    assert response.status_code == 200, "Invalid Error code"
-
-def test_register_new_user_part_data():
-    url = "register"
-    payload = {
-            "email": "eve.holt@reqres.in"
-           }
-    response = send_request("POST", url, payload)
-    response_dict = response.json()
-
-    assert response_dict["error"] == "Missing password", "Invalid error message"
-    assert response.status_code == 400, "Invalid Error code"
-
-def test_register_new_user_invalid_data():
-    url = "register"
-    payload = {
-        "username": "testUser",
-        "email": "testEmail@mail.com",
-        "password": "qwe45werty"
-    }
-    response = send_request("POST", url, payload)
-    response_dict = response.json()
-
-    assert response_dict["error"] == "Note: Only defined users succeed registration", "Invalid error message"
-    assert response.status_code == 400, "Invalid Error code"
-
-def test_register_new_user_empty_data():
-    url = "register"
-    payload = {
-        "username": "",
-        "email": "",
-        "password": ""
-    }
-    response = send_request("POST", url, payload)
-    response_dict = response.json()
-
-    assert response.status_code == 400, "Invalid Error code"
-
-def test_user_login():
-    url = "login"
-    payload = {
-        "email":"eve.holt@reqres.in",
-        "password":"cityslicka"
-    }
-    response = send_request("POST", url, payload)
-    response_dict = response.json()
-
-    assert ('token' in response_dict.keys()) == True, "Invalid data"
-    assert response.status_code == 200, "Invalid Error code"
-
-def test_not_existing_user_login():
-    url = "login"
-    payload = {
-        "username": "testUser",
-        "email": "testEmail@mail.com",
-        "password": "pass123"
-    }
-    response = send_request("POST", url, payload)
-    response_dict = response.json()
-
-    assert response_dict["error"] == "user not found"
-    assert response.status_code == 400, "Invalid Error code"
-
-def test_user_login_part_fields():
-    url = "login"
-    payload = {
-        "password":"cityslicka"
-    }
-    response = send_request("POST", url, payload)
-    response_dict = response.json()
-
-    assert response_dict["error"] == "Missing email or username"
-    assert response.status_code == 400, "Invalid Error code"
-
-def test_update_user_data_PATCH():
-    url = "users/2"
-    payload = {
-        "name": "morpheus",
-        "job": "zion resident"
-    }
-
-    response = send_request("PATCH", url, payload)
-    response_dict = response.json()
+        cached.request("GET", "users/2")
+        cached.request("PUT", "users/2", {"name": "morpheus", "job": "zion resident"})
+        after = cached.request("GET", "users/2")
+    finally:
+        cached.close()
 
-    try:
-        validate(response_dict, schemas.schema_update_user)
-    except:
-        print("Incorrect output, check JSON schema")
-    assert response.status_code == 200, "Invalid Error code"
+    #После изменения пользователя закэшированный ответ устарел
+    assert not getattr(after, "from_cache", False), "A PUT should drop the cached GET"
+    assert cached.requests_sent == 3, "The GET after the PUT should go to the server"
 
-def test_update_user_data_empty_body_PATCH():
-    url = "users/2"
-    payload = {}
-    response = send_request("PATCH", url, payload)
-    response_dict = response.json()
 
+def test_revalidated_recording(tmp_path):
+    path = str(tmp_path / "cached.cassette")
+    cached = Client(base_url=get_client().base_url, cache=ResponseCache(ttl=0.1),
+                    cassette=Recorder(path))
     try:
-        validate(response_dict, schemas.schema_update_user_part)
-    except:
-        print("Incorrect output, check JSON schema")
-
-    assert response.status_code == 200, "Invalid Error code"
-
-def test_update_user_data_invalid_id_PATCH():
-    url = "users/123"
-    payload = {
-        "name": "invalid_Id",
-        "job": "invalid_Id"
-    }
-    response = send_request("PATCH", url, payload)
-    response_dict = response.json()
-
+        recorded = []
+        for _ in range(3):
+            response = cached.request("GET", "users/2")
+            recorded.append((response.status_code, response.content))
+            time.sleep(0.15)
+    finally:
+        cached.close()
+    replaying = Client(base_url=OFFLINE_URL, cassette=Player(path))
     try:
-        validate(response_dict, schemas.schema_update_user)
-    except:
-        print("Incorrect output, check JSON schema")
-
-    assert response.status_code == 200, "Invalid Error code"
-
-def test_update_user_data_PUT():
-    url = "users/2"
-    payload = {
-        "name": "morpheus",
-        "job": "zion resident"
-    }
-    response = send_request("PUT", url, payload)
-    response_dict = response.json()
-
+        replayed = [(response.status_code, response.content) for response in
+                    (replaying.request("GET", "users/2") for _ in range(3))]
+    finally:
+        replaying.close()
+
+    assert cached.cache.stats()["revalidated"] == 2, "Stale entries should be revalidated"
+    assert replayed == recorded, "The cassette should hold the cached answers, not the bare 304s"
+
+
+def test_batch_user_creation():
+    names = ["batch_user_%d" % index for index in range(6)]
+    results = send_batch([("POST", "users", {"name": name, "job": "leader"}) for name in names]
+                         + [("POST", "login", {"password": "cityslicka"})], in_flight=4)
+
+    assert all(result.ok for result in results), "Batch items should not raise"
+    assert [result.response.status_code for result in results] == [201] * 6 + [400], \
+        "Results should come back in submission order"
+    assert [result.response.json()["name"] for result in results[:6]] == names, \
+        "Every result should belong to its own request"
+
+
+def test_rate_limited_batch():
+    with MockServer(rate_limit=10) as server:
+        limiter = AdaptiveLimiter(rate=40)
+        throttled = Client(base_url=server.base_url, limiter=limiter)
+        try:
+            results = throttled.batch([("GET", "users/2")] * 30, in_flight=4)
+        finally:
+            throttled.close()
+
+    assert [result.response.status_code for result in results] == [200] * 30, \
+        "Throttled requests should be retried until they pass"
+    assert limiter.backoffs > 0 and limiter.rate < 40, "429 should lower the request rate"
+
+
+def test_rate_limited_recording(tmp_path):
+    path = str(tmp_path / "throttled.cassette")
+    with MockServer(rate_limit=2) as server:
+        throttled = Client(base_url=server.base_url, cassette=Recorder(path),
+                           limiter=AdaptiveLimiter(rate=20, backoff=0.1))
+        try:
+            recorded = [throttled.request("GET", "users/2").status_code for _ in range(5)]
+        finally:
+            throttled.close()
+    replaying = Client(base_url=OFFLINE_URL, cassette=Player(path))
     try:
-        validate(response_dict, schemas.schema_update_user)
-    except:
-        print("Incorrect output, check JSON schema")
+        replayed = [replaying.request("GET", "users/2").status_code for _ in range(5)]
+    finally:
+        replaying.close()
 
-    assert response.status_code == 200, "Invalid Error code"
+    assert recorded == [200] * 5, "Throttled requests should be retried until they pass"
+    assert replayed == recorded, "The cassette should hold the answers, not the retried 429s"
 
-def test_update_user_data_empty_body_PUT():
-    url = "users/2"
-    payload = {}
-    response = send_request("PUT", url, payload)
-    response_dict = response.json()
 
+def test_live_metrics():
+    metrics = Metrics()
+    counted = Client(base_url=get_client().base_url, metrics=metrics)
     try:
-        validate(response_dict, schemas.schema_update_user_part)
-    except:
-        print("Incorrect output, check JSON schema")
-    assert response.status_code == 200, "Invalid Error code"
-
-def test_update_user_data_invalid_id_PUT():
-    url = "users/123"
-    payload = {
-        "name": "invalid_Id",
-        "job": "invalid_Id"
-    }
-    response = send_request("PUT", url, payload)
-    response_dict = response.json()
-
+        counted.batch([("GET", "users/2")] * 6 + [("GET", "users/23")] * 2, in_flight=4)
+    finally:
+        counted.close()
+    snapshot = metrics.snapshot()
+    text = metrics.prometheus()
+
+    assert snapshot["totals"][("GET", "users/2", 200)][0] == 6, "Every request should be counted"
+    assert snapshot["in_flight"] == 0, "No request should be left in flight"
+    assert snapshot["latency"][("GET", "users/23")].count == 2, "Latency should be kept per endpoint"
+    assert 'reqres_requests_total{method="GET",endpoint="users/23",status="404"} 2' in text, \
+        "Metrics should be served in the Prometheus format"
+
+
+def test_single_flight_user_data():
+    flight = SingleFlight()
+    shared = Client(base_url=get_client().base_url, single_flight=flight)
+    try:
+        #Ответ задерживается на 0.3 с, чтобы все четыре запроса застали его в полёте
+        with ThreadPoolExecutor(4) as pool:
+            responses = list(pool.map(lambda _: shared.request("GET", "users/2?delay=0.3"),
+                                      range(4)))
+    finally:
+        shared.close()
+
+    assert flight.stats() == {"flights": 1, "coalesced": 3}, "Concurrent GETs should share one call"
+    assert shared.stats()["requests"] == 1, "Only one request should reach the server"
+    assert all(response.json() is responses[0].json() for response in responses), \
+        "All callers should get the same decoded body"
+
+
+def record_scenarios(path, names=RECORDED):
+    """Runs the scenarios `names` against the server, recording them to `path`."""
+    chosen = [scenario for scenario in scenarios.SCENARIOS if scenario.name in names]
+    recording = Client(base_url=get_client().base_url, cassette=Recorder(path))
     try:
-        validate(response_dict, schemas.schema_update_user)
-    except:
-        print("Incorrect output, check JSON schema")
+        for scenario in chosen:
+            scenario.check(recording.request(scenario.method, scenario.uri, scenario.payload))
+    finally:
+        recording.close()
+    return chosen, recording.cassette.path
 
-    assert response.status_code == 200, "Invalid Error code"
 
-def test_new_user_creation():
-    url = "users"
-    payload = {
-        "name": "morpheus",
-        "job": "leader"
-    }
-    response = send_request("POST", url, payload)
-    response_dict = response.json()
+def test_cassette_replay(tmp_path):
+    chosen, path = record_scenarios(str(tmp_path))
 
+    assert os.path.dirname(path) == str(tmp_path) and path.endswith(".cassette"), \
+        "A directory should get a new cassette file for the run"
+    replaying = Client(base_url=OFFLINE_URL, cassette=Player(path))
     try:
-        validate(response_dict, schemas.schema_new_user)
-    except:
-        print("Incorrect output, check JSON schema")
-
-    assert response.status_code == 201, "Invalid Error code"
-
-#DELETE
-def test_user_delete():
-    url = "users/2"
-    response = send_request("DELETE", url)
-    assert response.status_code == 204, "Invalid Error code"
\ No newline at end of file
+        for scenario in chosen:
+            scenario.check(replaying.request(scenario.method, scenario.uri, scenario.payload))
+    finally:
+        replaying.close()
+    assert replaying.requests_sent == 0, "Replay should not send any request"
+
+    async def replay_async():
+        player = Player(path)
+        async_replaying = AsyncClient(base_url=OFFLINE_URL, cassette=player)
+        try:
+            return [await async_replaying.request(scenario.method, scenario.uri, scenario.payload)
+                    for scenario in chosen]
+        finally:
+            await async_replaying.close()
+            player.close()
+
+    for scenario, response in zip(chosen, asyncio.run(replay_async())):
+        scenario.check(response)
+
+
+def test_cassette_without_footer(tmp_path):
+    _, path = record_scenarios(str(tmp_path / "run.cassette"))
+    with open(path, "rb") as file:
+        data = file.read()
+    index_at = FOOTER.unpack(data[-FOOTER.size - len(MAGIC):-len(MAGIC)])[0]
+    #Запись оборвалась: ни индекса, ни футера
+    with open(str(tmp_path / "killed.cassette"), "wb") as file:
+        file.write(data[:index_at])
+
+    complete, killed = Player(path), Player(str(tmp_path / "killed.cassette"))
+    try:
+        assert killed.index == complete.index, "The index should be rebuilt by scanning the records"
+        assert killed.play("GET", "users/2", {}) == complete.play("GET", "users/2", {}), \
+            "Scanned records should replay the same responses"
+    finally:
+        complete.close()
+        killed.close()
+
+
+@pytest.mark.parametrize("target", ["columns", "results.parquet"])
+def test_results_export(tmp_path, target):
+    if target.endswith(".parquet"):
+        pytest.importorskip("pyarrow")
+    source, target = str(tmp_path / "results.jsonl"), str(tmp_path / target)
+    #Первый блок без ошибок (error и schema пустые), во втором блоке есть ошибки
+    rows = [{"time": 1.0 + index, "scenario": "user_data", "method": "GET", "uri": "users/2",
+             "status": 200, "latency": 0.01, "bytes": 338, "schema": None, "passed": True,
+             "error": None} for index in range(3)]
+    rows += [dict(rows[0], status=None, bytes=0, passed=False, error="ConnectionError()"),
+             dict(rows[0], schema="invalid", passed=False, error="AssertionError()")]
+    with open(source, "w") as file:
+        file.write("".join(json.dumps(row) + "\n" for row in rows))
+
+    assert results.main(["export", source, target, "--chunk", "3"]) == 0, "Export should succeed"
+    if target.endswith(".parquet"):
+        import pyarrow.parquet
+        table = pyarrow.parquet.read_table(target)
+        assert table.column("error").to_pylist() == [row["error"] for row in rows], \
+            "Errors of a later chunk should be exported"
+        assert table.column("status").to_pylist() == [200] * 3 + [None, 200], \
+            "A request without an answer should have no status"
+    else:
+        errors, names = results.read_column(target, "error")
+        assert [names[code] for code in errors] == [row["error"] for row in rows], \
+            "Errors of a later chunk should be exported"
+        expected = {"count": 5, "failed": 2, "mean": pytest.approx(0.01), "max": 0.01}
+        assert results.summary(target) == {"user_data": expected}, \
+            "The summary should read the exported columns"
+
+
+def test_custom_schema_user_data():
+    #Схема, которой нет в schemas.py, проверяется так же, как и остальные
+    custom = scenarios.Scenario("custom_schema_user_data", "GET", "users/2",
+                                schema={"type": "object", "required": ["data", "support"]})
+
+    assert custom.check(custom.run()) == "ok", "A schema outside schemas.py should be validated"
+
+
+def test_distributed_aggregate():
+    #Два воркера шлют гистограммы двумя пачками, координатор их объединяет
+    workers = [HistogramStats(), HistogramStats()]
+    batches = []
+    for index, stats in enumerate(workers):
+        for ms in range(1, 51):
+            stats.add("GET users/2", (ms + 50 * index) / 1000.0, ok=True)
+            if ms <= 25:
+                continue
+            if ms == 26:
+                batches.append(json.loads(json.dumps(stats.drain())))
+            stats.add("POST login", 0.002, ok=ms % 5 != 0)
+        batches.append(json.loads(json.dumps(stats.drain())))
+    aggregate = Aggregate()
+    for batch in batches:
+        aggregate.merge(batch)
+
+    assert aggregate.requests() == 150, "Every drained sample should be merged once"
+    rows = {row["endpoint"]: row for row in aggregate.report(2.0)}
+    assert rows["GET users/2"]["requests"] == 100 and rows["GET users/2"]["rps"] == 50.0, \
+        "Counts of both workers should add up"
+    assert rows["POST login"]["errors"] == 10, "Errors of both workers should add up"
+    assert rows["GET users/2"]["p50"] == pytest.approx(0.050, rel=0.03), \
+        "The merged median should be the median of all the samples"
+    assert rows["GET users/2"]["p99"] == pytest.approx(0.099, rel=0.03), \
+        "The merged p99 should be the p99 of all the samples"
+    assert rows["GET users/2"]["max"] == 0.1, "The merged max should be the max of all the samples"
+
+
+def test_typed_decoding():
+    from jsonschema.exceptions import ValidationError
+
+    user = {"id": 2, "email": "janet.weaver@reqres.in", "first_name": "Janet",
+            "last_name": "Weaver", "avatar": "https://reqres.in/img/faces/2-image.jpg"}
+    #Невалидные тела: у пользователя id строкой, у второго пользователя страницы нет email
+    bad_one = json.dumps({"data": dict(user, id="2")}).encode()
+    no_email = {key: value for key, value in user.items() if key != "email"}
+    bad_page = json.dumps({"data": [user, no_email], "total_pages": 1}).encode()
+    one = json.dumps({"data": user}).encode()
+    page = json.dumps({"data": [user, dict(user, id=3)], "total_pages": 2}).encode()
+
+    assert decode_typed(one, schemas.schema_user, "data").first_name == "Janet", \
+        "A valid body should decode into a record"
+    items, total_pages = decode_page(page, schemas.schema_user)
+    assert [item.id for item in items] == [2, 3] and total_pages == 2, \
+        "A valid page should decode all its items"
+    assert [record.id for record in decode_records(page, schemas.schema_user)] == [2, 3], \
+        "decode_records should yield every record of a page"
+    with pytest.raises(ValidationError):
+        decode_typed(bad_one, schemas.schema_user, "data")
+    with pytest.raises(ValidationError):
+        decode_page(bad_page, schemas.schema_user)
+    with pytest.raises(ValidationError):
+        list(decode_records(bad_page, schemas.schema_user))
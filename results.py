@@ -0,0 +1,251 @@
+"""One record per scenario execution, streamed to a JSONL file.
+
+    python main.py --mock --results results.jsonl
+    REQRES_RESULTS=results.jsonl python load.py --mock -d 60
+    python results.py export results.jsonl results.parquet    # needs pyarrow
+    python results.py export results.jsonl results.cols       # stdlib columns
+    python results.py summary results.cols
+
+A record holds: time, scenario, method, uri, status, latency (seconds),
+bytes, schema, passed and error. schema is "ok", "invalid", "deferred"
+(checked later in the validation_pool.py pool) or null when the scenario
+has no schema.
+
+write() only puts the record on a queue. A background thread batches the
+queue into the file, so a scenario never waits for the disk.
+
+export() turns the JSONL into columns in chunks of CHUNK rows, so the size
+of the file doesn't matter. With pyarrow it writes a Parquet file.
+Otherwise it writes a directory with one binary file per column, the
+typecode of the stdlib array module, plus columns.json. Strings such as
+scenario, method, uri and error are dictionary-encoded. read_column()
+loads a single column back.
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from array import array
+
+# REQRES_RESULTS=results.jsonl streams the scenario results of main.py / load.py
+RESULTS = os.environ.get("REQRES_RESULTS")
+BATCH = 1000        # records written per file write
+CHUNK = 100000      # rows converted at once by export()
+
+FIELDS = ("time", "scenario", "method", "uri", "status", "latency", "bytes", "schema",
+          "passed", "error")
+# typecodes of the stdlib columns, strings are dictionary codes
+TYPES = {"time": "d", "scenario": "I", "method": "I", "uri": "I", "status": "h",
+         "latency": "d", "bytes": "q", "schema": "b", "passed": "b", "error": "I"}
+SCHEMA_CODES = {None: -1, "invalid": 0, "ok": 1, "deferred": 2}
+
+_STOP = object()
+
+
+class ResultWriter:
+    """Appends records to a JSONL file from a background thread."""
+
+    def __init__(self, path, batch=BATCH):
+        self.path = path
+        self.batch = batch
+        self.written = 0
+        self._queue = queue.SimpleQueue()
+        self._file = open(path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._drain, name="result-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, record):
+        self._queue.put(record)
+
+    def _drain(self):
+        stop = False
+        while not stop:
+            records = [self._queue.get()]
+            while len(records) < self.batch:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if records[-1] is _STOP:
+                records.pop()
+                stop = True
+            self._file.write("".join(json.dumps(record, separators=(",", ":")) + "\n"
+                                     for record in records))
+            self._file.flush()
+            self.written += len(records)
+
+    def close(self):
+        """Writes what is still queued and closes the file."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._file.close()
+
+
+_writer = None
+
+
+def open_writer(path):
+    """Makes `path` the sink of emit(), closing the previous one."""
+    global _writer
+    close_writer()
+    _writer = ResultWriter(path)
+    return _writer
+
+
+def close_writer():
+    global _writer
+    if _writer is not None:
+        _writer.close()
+        _writer = None
+
+
+def emit(scenario, response, latency, schema=None, error=None):
+    """Record of one execution of `scenario`; a no-op without a writer."""
+    if _writer is None:
+        return
+    _writer.write({
+        "time": time.time(),
+        "scenario": scenario.name,
+        "method": scenario.method,
+        "uri": scenario.uri,
+        "status": response.status_code if response is not None else None,
+        "latency": latency,
+        "bytes": len(response.content) if response is not None else 0,
+        "schema": schema,
+        "passed": error is None,
+        "error": error,
+    })
+
+
+def read_records(path):
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def chunks(records, size=CHUNK):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def parquet_schema():
+    """One schema for all chunks: inferred per chunk, a column that is all
+    null in the first chunk (error, schema) would not match the later ones."""
+    import pyarrow
+
+    types = {"time": pyarrow.float64(), "status": pyarrow.int16(), "latency": pyarrow.float64(),
+             "bytes": pyarrow.int64(), "passed": pyarrow.bool_()}
+    return pyarrow.schema([(field, types.get(field, pyarrow.string())) for field in FIELDS])
+
+
+def export_parquet(path, target, size=CHUNK):
+    import pyarrow
+    import pyarrow.parquet
+
+    schema = parquet_schema()
+    with pyarrow.parquet.ParquetWriter(target, schema) as writer:
+        for chunk in chunks(read_records(path), size):
+            writer.write_table(pyarrow.Table.from_pylist(chunk, schema=schema))
+
+
+def export_columns(path, target, size=CHUNK):
+    """Stdlib columnar copy of the JSONL file in the directory `target`."""
+    os.makedirs(target, exist_ok=True)
+    dictionaries = {field: {} for field, code in TYPES.items() if code == "I"}
+    files = {field: open(os.path.join(target, field + ".bin"), "wb") for field in FIELDS}
+    rows = 0
+    try:
+        for chunk in chunks(read_records(path), size):
+            for field in FIELDS:
+                values = [record.get(field) for record in chunk]
+                if field in dictionaries:
+                    codes = dictionaries[field]
+                    values = [codes.setdefault(value, len(codes)) for value in values]
+                elif field == "schema":
+                    values = [SCHEMA_CODES[value] for value in values]
+                elif field == "status":
+                    values = [-1 if value is None else value for value in values]
+                array(TYPES[field], values).tofile(files[field])
+            rows += len(chunk)
+    finally:
+        for file in files.values():
+            file.close()
+    with open(os.path.join(target, "columns.json"), "w") as file:
+        json.dump({"rows": rows, "types": TYPES,
+                   "dictionaries": {field: list(codes) for field, codes in dictionaries.items()}},
+                  file)
+    return rows
+
+
+def export(path, target, size=CHUNK):
+    """Parquet for a *.parquet target (needs pyarrow), stdlib columns otherwise."""
+    if target.endswith(".parquet"):
+        export_parquet(path, target, size)
+    else:
+        export_columns(path, target, size)
+
+
+def read_column(target, field):
+    """(values array, dictionary or None) of one column written by export_columns()."""
+    with open(os.path.join(target, "columns.json")) as file:
+        meta = json.load(file)
+    values = array(meta["types"][field])
+    with open(os.path.join(target, field + ".bin"), "rb") as file:
+        values.fromfile(file, meta["rows"])
+    return values, meta["dictionaries"].get(field)
+
+
+def summary(target):
+    """{scenario: {"count", "failed", "mean", "max"}} from the stdlib columns,
+    reading only the scenario, latency and passed columns."""
+    scenarios, names = read_column(target, "scenario")
+    latencies, _ = read_column(target, "latency")
+    passed, _ = read_column(target, "passed")
+    totals = {}
+    for code, latency, ok in zip(scenarios, latencies, passed):
+        row = totals.setdefault(names[code], {"count": 0, "failed": 0, "total": 0.0, "max": 0.0})
+        row["count"] += 1
+        row["failed"] += not ok
+        row["total"] += latency
+        row["max"] = max(row["max"], latency)
+    for row in totals.values():
+        row["mean"] = row.pop("total") / row["count"]
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert and summarize scenario results")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert = commands.add_parser("export", help="JSONL to Parquet or stdlib columns")
+    convert.add_argument("source")
+    convert.add_argument("target", help="*.parquet, or a directory for the stdlib columns")
+    convert.add_argument("--chunk", type=int, default=CHUNK, help="rows converted at once")
+    report = commands.add_parser("summary", help="per scenario counts of exported columns")
+    report.add_argument("target")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        try:
+            export(args.source, args.target, args.chunk)
+        except ImportError:
+            parser.error("Parquet export needs pyarrow, give a directory for the stdlib columns")
+        return 0
+    print("%-40s %8s %7s %9s %9s" % ("scenario", "count", "failed", "mean ms", "max ms"))
+    for name, row in sorted(summary(args.target).items()):
+        print("%-40s %8d %7d %9.2f %9.2f" % (name, row["count"], row["failed"],
+                                             row["mean"] * 1000, row["max"] * 1000))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
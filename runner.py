@@ -0,0 +1,326 @@
+"""Runs test functions or SCENARIOS concurrently and prints a report.
+
+requests, aiohttp and jsonschema are imported only once they are needed,
+so `main.py --list` or a single `-o` scenario starts quickly; check with
+`python -X importtime main.py --list`.
+"""
+import argparse
+import functools
+import importlib
+import os
+import sys
+import time
+import traceback
+import types
+
+import config
+from results import RESULTS, close_writer, open_writer
+
+WORKERS = 8
+
+
+def serial(func):
+    """Marks a test that depends on the state left by other tests.
+    Serial tests run one by one after all independent tests have finished."""
+    func.serial = True
+    return func
+
+
+def background(func):
+    """Marks a slow test (e.g. the delay endpoint) that is started before all
+    others on its own thread, so it does not hold a worker or the critical path."""
+    func.background = True
+    return func
+
+
+class Result:
+    def __init__(self, name, passed, seconds, error=None):
+        self.name = name
+        self.passed = passed
+        self.seconds = seconds
+        self.error = error
+
+
+def collect(module):
+    """Test functions of a module in definition order or, if it defines
+    them, its SCENARIOS. Tests taking arguments want pytest fixtures
+    (tmp_path, parametrize) and are left to pytest."""
+    if hasattr(module, "SCENARIOS"):
+        return list(module.SCENARIOS)
+    return [func for name, func in vars(module).items()
+            if name.startswith("test_") and isinstance(func, types.FunctionType)
+            and func.__module__ == module.__name__
+            and func.__code__.co_argcount == len(func.__defaults__ or ())]
+
+
+def name_of(func):
+    return getattr(func, "name", None) or func.__name__
+
+
+def describe(func):
+    """"METHOD uri" of a scenario, the first docstring line of a test."""
+    if hasattr(func, "method"):
+        return "%s %s" % (func.method, func.uri)
+    return (func.__doc__ or "").strip().split("\n")[0]
+
+
+def run_test(func, profiler=None):
+    start = time.perf_counter()
+    try:
+        if profiler is None:
+            func()
+        else:
+            profiler.run(name_of(func), func)
+    except Exception:
+        return Result(name_of(func), False, time.perf_counter() - start,
+                      traceback.format_exc(limit=1))
+    return Result(name_of(func), True, time.perf_counter() - start)
+
+
+async def run_scenario_async(scenario):
+    start = time.perf_counter()
+    try:
+        await scenario.run_async()
+    except Exception:
+        return Result(scenario.name, False, time.perf_counter() - start,
+                      traceback.format_exc(limit=1))
+    return Result(scenario.name, True, time.perf_counter() - start)
+
+
+def split(tests, workers):
+    """(background, parallel, serial) groups; with one worker nothing overlaps."""
+    if workers <= 1:
+        return [], [], list(tests)
+    slow = [test for test in tests if getattr(test, "background", False)]
+    ordered = [test for test in tests if getattr(test, "serial", False)]
+    parallel = [test for test in tests if test not in slow and test not in ordered]
+    return slow, parallel, ordered
+
+
+def run_tests(tests, workers=WORKERS, profiler=None):
+    """Runs independent tests on a thread pool, then the serial ones in order.
+    Background tests run on their own threads for the whole run.
+    Returns the results in the order of `tests` and the total wall time."""
+    slow, parallel, ordered = split(tests, workers)
+    from concurrent.futures import ThreadPoolExecutor
+
+    run = functools.partial(run_test, profiler=profiler)
+
+    start = time.perf_counter()
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(len(slow), 1)) as background_pool:
+        pending = {func: background_pool.submit(run, func) for func in slow}
+        if parallel:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for func, result in zip(parallel, pool.map(run, parallel)):
+                    results[func] = result
+        for func in ordered:
+            results[func] = run(func)
+        for func, future in pending.items():
+            results[func] = future.result()
+    wall = time.perf_counter() - start
+    return [results[func] for func in tests], wall
+
+
+async def run_scenarios_async(scenarios, workers=WORKERS):
+    """Same as run_tests, but all scenarios share one event loop and at most
+    `workers` of them are in flight at the same time."""
+    import asyncio
+
+    import async_client
+
+    semaphore = asyncio.Semaphore(max(workers, 1))
+
+    async def bounded(scenario):
+        async with semaphore:
+            return await run_scenario_async(scenario)
+
+    slow, parallel, ordered = split(scenarios, workers)
+
+    start = time.perf_counter()
+    pending = {scenario: asyncio.ensure_future(run_scenario_async(scenario))
+               for scenario in slow}
+    results = dict(zip(parallel, await asyncio.gather(*map(bounded, parallel))))
+    for scenario in ordered:
+        results[scenario] = await run_scenario_async(scenario)
+    for scenario, task in pending.items():
+        results[scenario] = await task
+    wall = time.perf_counter() - start
+    await async_client.get_client().close()
+    return [results[scenario] for scenario in scenarios], wall
+
+
+def print_report(results, wall):
+    for result in results:
+        status = "PASS" if result.passed else "FAIL"
+        print("%s %-45s %7.3f s" % (status, result.name, result.seconds))
+        if result.error:
+            print("    " + result.error.strip().replace("\n", "\n    "))
+    summed = sum(result.seconds for result in results)
+    failed = sum(1 for result in results if not result.passed)
+    print("%d passed, %d failed" % (len(results) - failed, failed))
+    print("wall time: %.3f s, summed test time: %.3f s, speedup: %.2fx"
+          % (wall, summed, summed / wall if wall else 1.0))
+
+
+def attach_timings(http_client, path):
+    if not path:
+        return None
+    import timing
+    return timing.attach(http_client)
+
+
+def main(argv=None, default_module="reqres_pytest"):
+    parser = argparse.ArgumentParser(description="Run reqres tests or scenarios concurrently")
+    parser.add_argument("module", nargs="?", default=default_module,
+                        help="test module or a module with SCENARIOS, default %(default)s")
+    parser.add_argument("-o", "--only", action="append", metavar="NAME",
+                        help="run only this scenario or test, repeatable")
+    parser.add_argument("-l", "--list", action="store_true",
+                        help="print the scenarios or tests that would run and exit")
+    parser.add_argument("-w", "--workers", type=int, default=WORKERS,
+                        help="number of concurrent tests, 1 runs everything serially")
+    parser.add_argument("-e", "--engine", choices=("sync", "async"), default="sync",
+                        help="thread pool with the requests client or one event loop "
+                             "with the aiohttp client (scenario modules only)")
+    parser.add_argument("--base-url", default=config.BASE_URL,
+                        help="API root, default %(default)s")
+    parser.add_argument("--mock", action="store_true",
+                        help="start mock_server.py in the background and run against it")
+    parser.add_argument("--record", metavar="PATH",
+                        help="save every response to a cassette file (a directory gets one file per run)")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="answer requests from a recorded cassette, no network")
+    parser.add_argument("--timings", metavar="PATH", default=os.environ.get("REQRES_TIMINGS"),
+                        help="dump the per-request latency breakdown to PATH (.json or .csv)")
+    parser.add_argument("--cache", action="store_true", default=config.CACHE,
+                        help="serve repeated GETs from an in-process cache, see cache.py")
+    parser.add_argument("--single-flight", action="store_true", default=config.SINGLE_FLIGHT,
+                        help="share one call between concurrent identical GETs, "
+                             "see singleflight.py")
+    parser.add_argument("--rate", type=float, default=config.RATE,
+                        help="pace requests starting at RATE req/s, adapting to 429/5xx, "
+                             "see ratelimit.py")
+    parser.add_argument("--results", metavar="PATH", default=RESULTS,
+                        help="stream one JSONL record per scenario run to PATH, see results.py")
+    parser.add_argument("--schema-workers", type=int, default=0, metavar="N",
+                        help="check schemas in a pool of N workers instead of inline")
+    parser.add_argument("--schema-processes", action="store_true",
+                        help="use processes for --schema-workers")
+    parser.add_argument("--metrics-port", type=int, default=config.METRICS_PORT, metavar="PORT",
+                        help="serve live metrics on 127.0.0.1:PORT/metrics, see metrics.py")
+    parser.add_argument("--metrics-interval", type=float, default=config.METRICS_INTERVAL,
+                        metavar="SECONDS",
+                        help="print the live metrics every SECONDS with --metrics-port, 0 never")
+    parser.add_argument("--profile", metavar="DIR",
+                        help="sample every scenario, write flamegraph stacks to DIR and print "
+                             "a CPU / wait summary (sync engine), see profiling.py")
+    parser.add_argument("--profile-interval", type=float, metavar="SECONDS",
+                        help="seconds between two profiler samples")
+    args = parser.parse_args(argv)
+    if args.profile and args.engine == "async":
+        parser.error("--profile needs the sync engine")
+
+    tests = collect(importlib.import_module(args.module))
+    if args.only:
+        unknown = set(args.only) - {name_of(test) for test in tests}
+        if unknown:
+            parser.error("unknown scenario or test: %s" % ", ".join(sorted(unknown)))
+        tests = [test for test in tests if name_of(test) in args.only]
+    if args.list:
+        for test in tests:
+            print("%-40s %s" % (name_of(test), describe(test)))
+        return 0
+
+    if args.record or args.replay:
+        from cassette import open_cassette
+        cassette = open_cassette(args.record or args.replay,
+                                 "record" if args.record else "replay")
+    else:
+        cassette = config.cassette_from_env()
+
+    server = None
+    if args.mock:
+        from mock_server import MockServer
+        server = MockServer().start()
+        args.base_url = server.base_url
+
+    if args.results:
+        open_writer(args.results)
+    if args.schema_workers:
+        import validation_pool
+        validation_pool.start_pool(args.schema_workers, args.schema_processes)
+    cache = None
+    if args.cache:
+        from cache import ResponseCache
+        cache = ResponseCache()
+    single_flight = None
+    if args.single_flight:
+        from singleflight import SingleFlight
+        single_flight = SingleFlight()
+    live = None
+    if args.metrics_port:
+        import metrics
+        live = metrics.start(args.metrics_port, args.metrics_interval)
+    if args.engine == "async":
+        if not all(hasattr(test, "run_async") for test in tests):
+            parser.error("the async engine needs a module with SCENARIOS")
+        import asyncio
+
+        import async_client
+        timings = attach_timings(async_client.configure(base_url=args.base_url,
+                                                       cassette=cassette, cache=cache,
+                                                       limiter=async_client.limiter_for(args.rate),
+                                                       metrics=live, single_flight=single_flight),
+                                 args.timings)
+        results, wall = asyncio.run(run_scenarios_async(tests, args.workers))
+        print_report(results, wall)
+        http_client = async_client.get_client()
+        if http_client.cache is not None:
+            from cache import format_stats as format_cache_stats
+            print(format_cache_stats(http_client.cache.stats()))
+        if http_client.limiter is not None:
+            from ratelimit import format_stats as format_limiter_stats
+            print(format_limiter_stats(http_client.limiter.stats()))
+        if http_client.single_flight is not None:
+            from singleflight import format_stats as format_single_flight_stats
+            print(format_single_flight_stats(http_client.single_flight.stats()))
+    else:
+        import client
+        timings = attach_timings(client.configure(base_url=args.base_url, cassette=cassette,
+                                                  cache=cache, limiter=client.limiter_for(args.rate),
+                                                  metrics=live, single_flight=single_flight,
+                                                  pool_maxsize=max(args.workers, client.POOL_MAXSIZE)),
+                                 args.timings)
+        profiler = None
+        if args.profile:
+            from profiling import INTERVAL, Profiler
+            profiler = Profiler(args.profile_interval or INTERVAL).start()
+        results, wall = run_tests(tests, args.workers, profiler)
+        print_report(results, wall)
+        if profiler is not None:
+            profiler.stop()
+            profiler.print_summary()
+            profiler.dump(args.profile)
+        print(client.format_stats(client.get_client().stats()))
+    # loaded by the first schema check, if any ran
+    validation_pool = sys.modules.get("validation_pool")
+    if validation_pool is not None:
+        validation_pool.stop_pool()
+        validation_pool.report.print_report()
+    if timings is not None:
+        timings.print_summary()
+        timings.dump(args.timings)
+    if live is not None:
+        live.stop()
+        print("\n".join(live.summary_lines()))
+    close_writer()
+    if cassette is not None:
+        cassette.close()
+    if server is not None:
+        server.stop()
+    return 0 if all(result.passed for result in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,234 @@
+"""The reqres scenarios as one declarative table.
+
+main.py, reqres_pytest.py, runner.py, load.py and reqres_bench.py all run
+the entries of SCENARIOS. Importing this module sends no requests; a
+scenario talks to the API only when it is run.
+"""
+import os
+import time
+
+import results
+import schemas
+
+# Accepted extra time on top of the requested delay, seconds
+DELAY_TOLERANCE = float(os.environ.get("REQRES_DELAY_TOLERANCE", "1.0"))
+
+
+def assert_delay(elapsed, seconds, tolerance=None):
+    if tolerance is None:
+        tolerance = DELAY_TOLERANCE
+    assert seconds <= elapsed <= seconds + tolerance, \
+        "Delay should be %s sec (+%s), got %.3f" % (seconds, tolerance, elapsed)
+
+
+class Scenario:
+    """One request and what its response should look like.
+
+    status      expected status code
+    schema      JSON schema for the body, or for body["data"] if `data_schema`
+    error       expected body["error"] message
+    keys        keys the body must contain
+    data_len    expected len(body["data"])
+    data_ids    expected ids of body["data"] items (a list) or of body["data"] (an int)
+    empty       the body must be an empty JSON object
+    delay       expected response time in seconds, see assert_delay
+    check       extra callable(response) for anything the fields above can't express
+
+    serial scenarios depend on the state left by the others and run one
+    by one at the end; background ones are slow and started first.
+    Schema mismatches don't fail the scenario, like the original checks;
+    they are collected in validation_pool.report. Every run goes to
+    results.emit(), see results.py.
+    """
+
+    def __init__(self, name, method, uri, payload={}, status=200, schema=None,
+                 data_schema=False, error=None, keys=(), data_len=None, data_ids=None,
+                 empty=False, delay=None, check=None, serial=False, background=False):
+        self.name = name
+        self.method = method
+        self.uri = uri
+        self.payload = payload
+        self.status = status
+        self.schema = schema
+        self.data_schema = data_schema
+        self.error = error
+        self.keys = keys
+        self.data_len = data_len
+        self.data_ids = data_ids
+        self.empty = empty
+        self.delay = delay
+        self.extra_check = check
+        self.serial = serial
+        # slow scenarios started first and awaited last, outside the worker limit
+        self.background = background
+
+    def check(self, response):
+        """Asserts the expectations; returns the schema outcome for results.py,
+        see validation_pool.check(), or None without a schema."""
+        if self.delay is not None:
+            assert_delay(response.elapsed.total_seconds(), self.delay)
+        assert response.status_code == self.status, \
+            "Error code should be %d, got %d" % (self.status, response.status_code)
+        if self.status == 204:
+            return None
+        body = response.json()
+        if self.empty:
+            assert len(body) == 0, "Request should return empty JSON file"
+        if self.error is not None:
+            assert body["error"] == self.error, "Invalid error message"
+        for key in self.keys:
+            assert key in body, "Output should contain %s value" % key
+        if self.data_len is not None:
+            assert len(body['data']) == self.data_len, "List should contain all the values"
+        if isinstance(self.data_ids, int):
+            assert body['data']['id'] == self.data_ids, \
+                "Response should return object with id = %d" % self.data_ids
+        elif self.data_ids is not None:
+            ids = [item['id'] for item in body['data']]
+            assert ids == list(self.data_ids), \
+                "Response should return objects with id's %s" % list(self.data_ids)
+        schema = None
+        if self.schema is not None:
+            # jsonschema is imported by the first scenario with a schema
+            import validation_pool
+            if self.data_schema:
+                schema = validation_pool.check(self.name, body['data'], self.schema, "$.data")
+            else:
+                schema = validation_pool.check(self.name, body, self.schema)
+        if self.extra_check is not None:
+            self.extra_check(response)
+        return schema
+
+    def __call__(self):
+        return self.run()
+
+    def _checked(self, response, start):
+        latency = time.perf_counter() - start
+        try:
+            schema = self.check(response)
+        except Exception as error:
+            results.emit(self, response, latency, error=str(error) or type(error).__name__)
+            raise
+        results.emit(self, response, latency, schema)
+        return response
+
+    def run(self):
+        from client import send_request
+        start = time.perf_counter()
+        try:
+            response = send_request(self.method, self.uri, self.payload)
+        except Exception as error:
+            results.emit(self, None, time.perf_counter() - start, error=repr(error))
+            raise
+        return self._checked(response, start)
+
+    async def run_async(self):
+        from async_client import send_request
+        start = time.perf_counter()
+        try:
+            response = await send_request(self.method, self.uri, self.payload)
+        except Exception as error:
+            results.emit(self, None, time.perf_counter() - start, error=repr(error))
+            raise
+        return self._checked(response, start)
+
+    def as_test(self, module):
+        """Plain test function for pytest and runner.py, named test_<name>."""
+        def test():
+            self.run()
+        test.__name__ = test.__qualname__ = "test_" + self.name
+        test.__module__ = module
+        test.__doc__ = "%s %s" % (self.method, self.uri)
+        test.serial = self.serial
+        test.background = self.background
+        return test
+
+    def __repr__(self):
+        return "Scenario(%r, %s %s)" % (self.name, self.method, self.uri)
+
+
+SCENARIOS = [
+    #GET
+    #Получение полного списка пользователей
+    Scenario("full_users_list", "GET", "users?page=1&per_page=12", data_len=12),
+    #Получение среза списка
+    Scenario("part_of_the_users_list", "GET", "users?page=2&per_page=2", data_len=2, data_ids=[3, 4]),
+    #Получение данных пользователя
+    Scenario("user_data", "GET", "users/2", data_ids=2,
+             schema=schemas.schema_user, data_schema=True),
+    #Получение данных пользователя с некорректным ID
+    Scenario("user_data_with_id_0", "GET", "users/0", status=404, empty=True),
+    Scenario("user_data_with_id_13", "GET", "users/13", status=404, empty=True),
+    #Получение списка ресурсов
+    Scenario("resources_list", "GET", "{resource}?page=1&per_page=12", data_len=12),
+    #Получение среза списка ресурсов
+    Scenario("part_of_the_resources_list", "GET", "{resource}?page=2&per_page=2",
+             data_len=2, data_ids=[3, 4]),
+    #Получение данных заданного ресурса
+    Scenario("one_resource_data", "GET", "{resource}/4", data_ids=4,
+             schema=schemas.schema_resource, data_schema=True),
+    #Получение данных ресурса с некорректным ID
+    Scenario("resource_data_with_id_0", "GET", "{resource}/0", status=404, empty=True),
+    Scenario("resource_data_with_id_13", "GET", "{resource}/13", status=404, empty=True),
+    #Проверка задержки выполнения запроса
+    Scenario("request_delay", "GET", "users?delay=10", delay=10, background=True),
+
+    #POST
+    #Регистрация нового пользователя
+    Scenario("register_new_user", "POST", "register", keys=("id", "token"),
+             payload={"email": "eve.holt@reqres.in", "password": "pistol"}),
+    #Создание пользователя - не все обязательные поля
+    Scenario("register_new_user_part_data", "POST", "register", status=400,
+             error="Missing password", payload={"email": "eve.holt@reqres.in"}),
+    #Создание пользователя c невалидными данными
+    Scenario("register_new_user_invalid_data", "POST", "register", status=400,
+             error="Note: Only defined users succeed registration",
+             payload={"username": "testUser", "email": "testEmail@mail.com", "password": "qwe45werty"}),
+    #Создание пользователя c пустыми данными
+    Scenario("register_new_user_empty_data", "POST", "register", status=400,
+             payload={"username": "", "email": "", "password": ""}),
+    #Авторизация пользователя
+    Scenario("user_login", "POST", "login", keys=("token",),
+             payload={"email": "eve.holt@reqres.in", "password": "cityslicka"}),
+    #Авторизация несуществующего пользователя
+    Scenario("not_existing_user_login", "POST", "login", status=400, error="user not found",
+             payload={"username": "testUser", "email": "testEmail@mail.com", "password": "pass123"}),
+    #Неполное заполнение полей при логировании
+    Scenario("user_login_part_fields", "POST", "login", status=400,
+             error="Missing email or username", payload={"password": "cityslicka"}),
+
+    #PATCH/PUT
+    #Обновление данных пользователя
+    Scenario("update_user_data_PATCH", "PATCH", "users/2", schema=schemas.schema_update_user,
+             payload={"name": "morpheus", "job": "zion resident"}),
+    #Body запроса не содержит данных
+    Scenario("update_user_data_empty_body_PATCH", "PATCH", "users/2",
+             schema=schemas.schema_update_user_part),
+    #Обновление данных пользователя - невалидный Id
+    Scenario("update_user_data_invalid_id_PATCH", "PATCH", "users/123",
+             schema=schemas.schema_update_user, payload={"name": "invalid_Id", "job": "invalid_Id"}),
+    Scenario("update_user_data_PUT", "PUT", "users/2", schema=schemas.schema_update_user,
+             payload={"name": "morpheus", "job": "zion resident"}),
+    Scenario("update_user_data_empty_body_PUT", "PUT", "users/2",
+             schema=schemas.schema_update_user_part),
+    Scenario("update_user_data_invalid_id_PUT", "PUT", "users/123",
+             schema=schemas.schema_update_user, payload={"name": "invalid_Id", "job": "invalid_Id"}),
+    #Создание нового пользователя
+    Scenario("new_user_creation", "POST", "users", status=201, schema=schemas.schema_new_user,
+             payload={"name": "morpheus", "job": "leader"}),
+
+    #DELETE
+    #Удаление существующего пользователя
+    Scenario("user_delete", "DELETE", "users/2", status=204, serial=True),
+]
+
+
+def select(names=None):
+    """Scenarios with the given names, in table order; all of them without names."""
+    if not names:
+        return list(SCENARIOS)
+    known = {scenario.name for scenario in SCENARIOS}
+    unknown = [name for name in names if name not in known]
+    if unknown:
+        raise ValueError("Unknown scenario: %s" % ", ".join(unknown))
+    return [scenario for scenario in SCENARIOS if scenario.name in names]
@@ -0,0 +1,112 @@
+"""Concurrent identical requests sharing one network call.
+
+    python main.py --mock --single-flight
+    REQRES_SINGLE_FLIGHT=1 pytest reqres_pytest.py --mock
+
+While a GET or HEAD is in flight, the same request (method, uri and
+headers) from another scenario waits for it instead of going to the
+server: the first caller leads the flight, the others are coalesced into
+it. All of them get the same response object, whose json() decodes the
+body once. The decoded body is shared too, so the checks must not modify
+it. If the call raises, every caller of the flight gets the exception.
+
+Only calls that overlap in time are coalesced. A request that starts
+after the flight has landed goes to the server again; cache.py is the
+layer that keeps responses around.
+"""
+import asyncio
+import threading
+
+METHODS = ("GET", "HEAD")   # idempotent and without a body, safe to share
+
+
+def key_of(type, uri, data, headers):
+    """Key of a request that may be coalesced, None for one that may not."""
+    if type not in METHODS or data:
+        return None
+    return type, uri, tuple(sorted(headers.items()))
+
+
+def shared(response):
+    """Makes response.json() decode once for all the callers of a flight."""
+    decode = response.json
+    decoded = []
+
+    def json(**kwargs):
+        if not decoded:
+            decoded.append(decode(**kwargs))
+        return decoded[0]
+
+    response.json = json
+    return response
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class SingleFlight:
+    """In-flight calls by key; call() from threads or call_async() from one
+    event loop, not both."""
+
+    def __init__(self):
+        self.flights = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def call(self, key, send):
+        """send() unless a call with `key` is in flight, then its outcome."""
+        with self._lock:
+            flight = self._calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._calls[key] = _Flight()
+                self.flights += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+        try:
+            flight.response = shared(send())
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            flight.done.set()
+        return flight.response
+
+    async def call_async(self, key, send):
+        """call() for a coroutine function; the flight goes on if the
+        caller leading it is cancelled."""
+        task = self._calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            async def fly():
+                try:
+                    return shared(await send())
+                finally:
+                    del self._calls[key]
+
+            task = self._calls[key] = asyncio.ensure_future(fly())
+            self.flights += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {"flights": self.flights, "coalesced": self.coalesced}
+
+
+def format_stats(stats):
+    calls = stats["flights"] + stats["coalesced"]
+    return ("single-flight: {flights} sent, {coalesced} coalesced ({share:.0f}% of {calls} calls)"
+            .format(share=100.0 * stats["coalesced"] / calls if calls else 0.0, calls=calls,
+                    **stats))
@@ -0,0 +1,280 @@
+"""Soak test: the scenarios in a loop for hours, watching for leaks.
+
+    python soak.py --mock -d 10m --interval 10 --warmup 10s --out soak.jsonl
+    python soak.py -d 4h --interval 60 --out soak.jsonl
+    python soak.py -o user_data -o user_login          # until Ctrl-C
+
+Every round runs the scenarios once (the background ones only with -o)
+on the shared client. Every `interval` seconds a sample of the process
+is printed and appended to --out as one JSON line. A sample holds RSS,
+open file descriptors, open sockets, the client's connection counters,
+traced Python memory and the `top` allocation sites that grew the most
+since the start.
+
+The first --warmup seconds fill the imports, the connection pool and
+the allocator (and tracemalloc's own tables) and are not sampled.
+
+Once there are MIN_SAMPLES samples, the least-squares slope of the last
+`window` samples is checked. A warning is printed when RSS grows faster
+than --rss-growth MB/h, or the socket count faster than --socket-growth
+per hour, and the rise within the window is above MIN_RSS_RISE or
+MIN_SOCKET_RISE. With --mock the server's sockets live in this process
+too.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import config
+from runner import WORKERS, run_tests
+
+INTERVAL = 30.0         # seconds between two samples
+WARMUP = 30.0           # seconds of rounds before the baseline
+TOP = 5                 # allocation sites per sample
+WINDOW = 20             # samples the trends are computed over
+MIN_SAMPLES = 5
+RSS_GROWTH = 10.0       # MB per hour
+SOCKET_GROWTH = 5.0     # sockets per hour
+# rises within the window below these are noise, whatever the slope
+MIN_RSS_RISE = 2 ** 20  # bytes
+MIN_SOCKET_RISE = 2
+
+
+def _process():
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process()
+
+
+def rss(process):
+    if process is not None:
+        return process.memory_info().rss
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def open_fds(process):
+    if process is not None and hasattr(process, "num_fds"):
+        return process.num_fds()
+    return len(os.listdir("/proc/self/fd"))
+
+
+def open_sockets(process):
+    if process is not None:
+        connections = getattr(process, "net_connections", None) or process.connections
+        return len(connections(kind="inet"))
+    count = 0
+    for fd in os.listdir("/proc/self/fd"):
+        try:
+            count += os.readlink("/proc/self/fd/" + fd).startswith("socket:")
+        except OSError:
+            pass
+    return count
+
+
+def parse_duration(text):
+    """'90', '90s', '15m' or '4h' -> seconds."""
+    units = {"s": 1, "m": 60, "h": 3600}
+    if text[-1:] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def slope(points):
+    """Least-squares slope of (seconds, value) points, per hour."""
+    count = len(points)
+    mean_t = sum(t for t, _ in points) / count
+    mean_v = sum(v for _, v in points) / count
+    spread = sum((t - mean_t) ** 2 for t, _ in points)
+    if not spread:
+        return 0.0
+    return sum((t - mean_t) * (v - mean_v) for t, v in points) / spread * 3600
+
+
+class Sampler:
+    def __init__(self, top=TOP, trace=True):
+        self.top = top
+        self.trace = trace
+        self.process = _process()
+        self.start = time.time()
+        self.baseline = None
+        if trace:
+            tracemalloc.start()
+
+    def reset(self):
+        """Time and allocations count from now on."""
+        if self.trace:
+            # the first snapshots and comparisons grow the heap themselves
+            self.baseline = self._snapshot()
+            self.sample()
+            self.baseline = self._snapshot()
+        self.start = time.time()
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__),))
+
+    def sample(self, **extra):
+        sample = {"time": time.time(), "elapsed": time.time() - self.start,
+                  "rss": rss(self.process), "fds": open_fds(self.process),
+                  "sockets": open_sockets(self.process)}
+        sample.update(extra)
+        if self.baseline is not None:
+            sample["traced"] = tracemalloc.get_traced_memory()[0]
+            stats = self._snapshot().compare_to(self.baseline, "lineno")
+            sample["top"] = [{"where": "%s:%d" % (stat.traceback[0].filename, stat.traceback[0].lineno),
+                              "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+                             for stat in stats[:self.top]]
+        return sample
+
+
+def _rise(samples, key):
+    return max(s[key] for s in samples) - min(s[key] for s in samples[:len(samples) // 2 or 1])
+
+
+def trend_warnings(samples, window=WINDOW, rss_growth=RSS_GROWTH, socket_growth=SOCKET_GROWTH):
+    if len(samples) < MIN_SAMPLES:
+        return []
+    recent = samples[-window:]
+    warnings = []
+    growth = slope([(s["elapsed"], s["rss"]) for s in recent]) / 2 ** 20
+    if growth > rss_growth and _rise(recent, "rss") >= MIN_RSS_RISE:
+        warnings.append("RSS grows %.1f MB/h over the last %d samples" % (growth, len(recent)))
+    growth = slope([(s["elapsed"], s["sockets"]) for s in recent])
+    if growth > socket_growth and _rise(recent, "sockets") >= MIN_SOCKET_RISE:
+        warnings.append("open sockets grow %.1f/h over the last %d samples (now %d)"
+                        % (growth, len(recent), recent[-1]["sockets"]))
+    return warnings
+
+
+def print_sample(sample):
+    print("%8.0f s  rss %7.1f MB  fds %4d  sockets %4d  rounds %6d  failed %5d%s" % (
+        sample["elapsed"], sample["rss"] / 2.0 ** 20, sample["fds"], sample["sockets"],
+        sample["rounds"], sample["failed"],
+        "  traced %.1f MB" % (sample["traced"] / 2.0 ** 20) if "traced" in sample else ""))
+    for site in sample.get("top", []):
+        print("          %+9.1f KB %+7d blocks  %s"
+              % (site["size_diff"] / 1024.0, site["count_diff"], site["where"]))
+
+
+def soak(tests, duration=None, interval=INTERVAL, workers=WORKERS, out=None, top=TOP,
+         trace=True, window=WINDOW, rss_growth=RSS_GROWTH, socket_growth=SOCKET_GROWTH,
+         warmup=WARMUP):
+    """Runs `tests` round after round for `duration` seconds (forever with
+    None, until Ctrl-C), the first `warmup` of them unsampled. Returns the
+    samples."""
+    import client
+
+    deadline = None if duration is None else time.time() + duration
+    rounds = failed = 0
+    sampler = Sampler(top, trace)
+    samples = []
+    file = open(out, "a") if out else None
+    try:
+        # imports, the connection pool, the allocator and tracemalloc itself
+        # grow once, before the baseline
+        warm = time.time() + warmup
+        while rounds == 0 or time.time() < warm:
+            results, _ = run_tests(tests, workers)
+            rounds += 1
+            failed += sum(1 for result in results if not result.passed)
+        sampler.reset()
+        next_sample = time.time()
+        while deadline is None or time.time() < deadline:
+            if time.time() >= next_sample:
+                stats = client.get_client().stats()
+                sample = sampler.sample(rounds=rounds, failed=failed,
+                                        requests=stats["requests"],
+                                        connections_opened=stats["connections_opened"])
+                samples.append(sample)
+                print_sample(sample)
+                if file is not None:
+                    file.write(json.dumps(sample) + "\n")
+                    file.flush()
+                for warning in trend_warnings(samples, window, rss_growth, socket_growth):
+                    print("WARNING " + warning)
+                next_sample += interval
+            results, _ = run_tests(tests, workers)
+            rounds += 1
+            failed += sum(1 for result in results if not result.passed)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if file is not None:
+            file.close()
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the reqres scenarios in a loop and watch for leaks")
+    parser.add_argument("-d", "--duration", type=parse_duration,
+                        help="how long to run, e.g. 90s, 15m, 4h; default until Ctrl-C")
+    parser.add_argument("--interval", type=float, default=INTERVAL,
+                        help="seconds between two samples, default %(default)s")
+    parser.add_argument("--warmup", type=parse_duration, default=WARMUP,
+                        help="seconds of rounds before the first sample, default %(default)s")
+    parser.add_argument("-o", "--only", action="append", metavar="NAME",
+                        help="run only this scenario, repeatable")
+    parser.add_argument("-w", "--workers", type=int, default=WORKERS)
+    parser.add_argument("--out", metavar="PATH", help="append the samples to PATH as JSON lines")
+    parser.add_argument("--top", type=int, default=TOP, help="allocation sites per sample")
+    parser.add_argument("--no-tracemalloc", action="store_true",
+                        help="skip the allocation sites, tracemalloc slows every allocation")
+    parser.add_argument("--window", type=int, default=WINDOW,
+                        help="samples the trends are computed over")
+    parser.add_argument("--rss-growth", type=float, default=RSS_GROWTH,
+                        help="warn above this RSS growth, MB per hour")
+    parser.add_argument("--socket-growth", type=float, default=SOCKET_GROWTH,
+                        help="warn above this growth of open sockets, per hour")
+    parser.add_argument("--metrics-port", type=int, default=config.METRICS_PORT, metavar="PORT",
+                        help="serve live metrics on 127.0.0.1:PORT/metrics, see metrics.py")
+    parser.add_argument("--metrics-interval", type=float, default=config.METRICS_INTERVAL,
+                        metavar="SECONDS",
+                        help="print the live metrics every SECONDS with --metrics-port, 0 never")
+    parser.add_argument("--base-url", default=config.BASE_URL,
+                        help="API root, default %(default)s")
+    parser.add_argument("--mock", action="store_true",
+                        help="start mock_server.py in the background and run against it")
+    args = parser.parse_args(argv)
+
+    from scenarios import select
+    try:
+        tests = select(args.only)
+    except ValueError as error:
+        parser.error(str(error))
+    if not args.only:
+        tests = [test for test in tests if not test.background]
+
+    server = None
+    if args.mock:
+        from mock_server import MockServer
+        server = MockServer().start()
+        args.base_url = server.base_url
+    live = None
+    if args.metrics_port:
+        import metrics
+        live = metrics.start(args.metrics_port, args.metrics_interval)
+    import client
+    client.configure(base_url=args.base_url, metrics=live,
+                     pool_maxsize=max(args.workers, client.POOL_MAXSIZE))
+
+    samples = soak(tests, args.duration, args.interval, args.workers, args.out, args.top,
+                   not args.no_tracemalloc, args.window, args.rss_growth, args.socket_growth,
+                   args.warmup)
+    client.get_client().close()
+    if live is not None:
+        live.stop()
+    if server is not None:
+        server.stop()
+    warnings = trend_warnings(samples, args.window, args.rss_growth, args.socket_growth)
+    print("%d samples, %s" % (len(samples), "; ".join(warnings) if warnings else "no upward trend"))
+    return 1 if warnings else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
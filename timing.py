@@ -0,0 +1,164 @@
+"""Per-request latency breakdown collected from the client hooks.
+
+    store = timing.attach(get_client())
+    ...
+    store.dump("timings.json")   # or timings.csv
+
+Every record has the phases in seconds: dns, connect, tls (only the TLS
+handshake, 0 for plain HTTP or a reused connection), ttfb (request sent to
+response headers, server time included), download (body) and decode
+(response.json(), filled in when the check decodes the body).
+"""
+import csv
+import json
+import math
+import os
+import threading
+
+# REQRES_TIMINGS=timings.json (or .csv) dumps the records at the end of main.py
+TIMINGS = os.environ.get("REQRES_TIMINGS")
+
+PHASES = ("dns", "connect", "tls", "ttfb", "download", "decode", "total")
+FIELDS = ("method", "endpoint", "uri", "status", "bytes") + PHASES
+
+
+def new_record(method, uri):
+    record = {"method": method.upper(), "endpoint": uri.split("?")[0], "uri": uri,
+              "status": None, "bytes": 0}
+    record.update((phase, 0.0) for phase in PHASES)
+    return record
+
+
+class Histogram:
+    """Log-bucketed latency histogram, about 2% relative error.
+    Histograms of the same phase can be merged, e.g. from several processes."""
+
+    MIN = 1e-6      # seconds, everything below goes to the first bucket
+    GROWTH = 1.02
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def bucket(self, value):
+        if value <= self.MIN:
+            return 0
+        return int(math.log(value / self.MIN, self.GROWTH)) + 1
+
+    def add(self, value, count=1):
+        index = self.bucket(value)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        # list() copies atomically, `other` may still be written by its thread
+        for index, count in list(other.buckets.items()):
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile."""
+        if not self.count:
+            return 0.0
+        rank = max(int(math.ceil(p / 100.0 * self.count)), 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                upper = self.MIN * self.GROWTH ** index
+                return min(max(upper, self.min), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self):
+        return {"count": self.count, "mean": self.mean(), "min": self.min or 0.0,
+                "p50": self.percentile(50), "p95": self.percentile(95),
+                "p99": self.percentile(99), "max": self.max or 0.0}
+
+    def to_dict(self):
+        return {"buckets": {str(index): count for index, count in self.buckets.items()},
+                "count": self.count, "total": self.total, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.buckets = {int(index): count for index, count in data["buckets"].items()}
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        return histogram
+
+
+class TimingStore:
+    """In-memory store of request records. add() is the client hook."""
+
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def histograms(self):
+        """{"GET users/2": {phase: Histogram}} over all records so far."""
+        result = {}
+        for record in list(self.records):
+            phases = result.setdefault("%s %s" % (record["method"], record["endpoint"]),
+                                       {phase: Histogram() for phase in PHASES})
+            for phase in PHASES:
+                phases[phase].add(record[phase])
+        return result
+
+    def summary(self):
+        return {key: {phase: histogram.summary() for phase, histogram in phases.items()}
+                for key, phases in self.histograms().items()}
+
+    def dump_json(self, path):
+        with open(path, "w") as file:
+            json.dump({"requests": len(self.records), "endpoints": self.summary()},
+                      file, indent=2)
+
+    def dump_csv(self, path):
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(list(self.records))
+
+    def dump(self, path):
+        """JSON summary per endpoint, or one CSV row per request for *.csv."""
+        if path.endswith(".csv"):
+            self.dump_csv(path)
+        else:
+            self.dump_json(path)
+
+    def print_summary(self):
+        print("%-28s %6s %8s %8s %8s %8s %8s %8s %8s" % (
+            "endpoint", "count", "dns", "connect", "tls", "ttfb", "download", "decode", "p95 total"))
+        for key, phases in sorted(self.histograms().items()):
+            print("%-28s %6d %s %8.1f" % (
+                key, phases["total"].count,
+                " ".join("%8.1f" % (phases[phase].mean() * 1000) for phase in PHASES[:-1]),
+                phases["total"].percentile(95) * 1000))
+        print("(mean ms per phase)")
+
+
+def attach(client):
+    """Starts collecting the timings of `client` into a new TimingStore."""
+    store = TimingStore()
+    client.add_hook(store.add)
+    return store
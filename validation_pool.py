@@ -0,0 +1,229 @@
+"""Schema checks of the scenarios and the aggregated report of their failures.
+
+    python main.py --mock --schema-workers 4                  # threads
+    python load.py --mock --schema-workers 4 --schema-processes
+
+check() validates a response body against a schema from schemas.py and
+adds every failure to the shared SchemaReport. Each failure is counted by
+scenario, JSON path and failed keyword; the report is printed at the end
+of the run.
+
+By default the check runs inline, on the thread that made the request.
+With start_pool() it goes to a thread or process pool and the I/O side
+moves on. At most `max_pending` checks wait in the pool; past that,
+check() blocks until one finishes, so validation can't fall behind
+without bound. Process workers get the decoded body and the schema name,
+and validate with their own cached validators.
+"""
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from validators import SCHEMAS, get_validator
+
+MAX_PENDING = 1000      # checks queued in the pool before check() blocks
+PROCESS_BATCH = 100     # checks sent to a process worker at once, IPC is the bottleneck
+EXAMPLES = 3            # instances of a failure kept for the report
+
+_names = {id(schema): name for name, schema in SCHEMAS.items()}
+
+
+def schema_name(schema):
+    """Name of a schemas.py schema, all a process worker can be sent."""
+    name = _names.get(id(schema))
+    if name is None:
+        raise ValueError("Schema checks in worker processes need a schema defined in "
+                         "schemas.py, got %.60r; use threads or check inline" % (schema,))
+    return name
+
+
+def format_path(parts, root="$"):
+    path = root
+    for part in parts:
+        path += "[%d]" % part if isinstance(part, int) else "." + part
+    return path
+
+
+def schema_errors(schema, instance):
+    """(path, keyword, message) of every error of `instance` against `schema`."""
+    validator = get_validator(schema)
+    if validator.is_valid(instance):
+        return []
+    return [(format_path(error.absolute_path), error.validator, error.message)
+            for error in validator.iter_errors(instance)]
+
+
+def find_errors(name, instance):
+    """schema_errors() against SCHEMAS[name]."""
+    return schema_errors(SCHEMAS[name], instance)
+
+
+def find_errors_many(items):
+    """find_errors() for a batch of (name, instance), run in the processes."""
+    return [find_errors(name, instance) for name, instance in items]
+
+
+def schema_errors_many(items):
+    """schema_errors() for a batch of (schema, instance), run in the threads."""
+    return [schema_errors(schema, instance) for schema, instance in items]
+
+
+class SchemaReport:
+    """Failures counted by (scenario, path, keyword), thread safe."""
+
+    def __init__(self):
+        self.checked = 0
+        self.invalid = 0
+        self.failures = {}
+        self._lock = threading.Lock()
+
+    def add(self, scenario, errors, root="$"):
+        with self._lock:
+            self.checked += 1
+            if not errors:
+                return
+            self.invalid += 1
+            for path, keyword, message in errors:
+                key = (scenario, root + path[1:], keyword)
+                failure = self.failures.get(key)
+                if failure is None:
+                    failure = self.failures[key] = {"count": 0, "messages": []}
+                failure["count"] += 1
+                if len(failure["messages"]) < EXAMPLES and message not in failure["messages"]:
+                    failure["messages"].append(message)
+
+    def rows(self):
+        """[(scenario, path, keyword, count, messages)], most frequent first."""
+        with self._lock:
+            rows = [key + (failure["count"], list(failure["messages"]))
+                    for key, failure in self.failures.items()]
+        return sorted(rows, key=lambda row: (-row[3], row[:3]))
+
+    def lines(self):
+        if not self.checked:
+            return []
+        lines = ["schema checks: %d, invalid responses: %d" % (self.checked, self.invalid)]
+        for scenario, path, keyword, count, messages in self.rows():
+            lines.append("  %-35s %-25s %-10s %6d  %s"
+                         % (scenario, path, keyword, count, "; ".join(messages)))
+        return lines
+
+    def print_report(self):
+        for line in self.lines():
+            print(line)
+
+
+class ValidationPool:
+    """Bounded pool running schema checks off the I/O thread, `batch`
+    checks per task (PROCESS_BATCH for processes, 1 for threads).
+    Processes only take the schemas defined in schemas.py."""
+
+    def __init__(self, workers, processes=False, max_pending=MAX_PENDING, report=None,
+                 batch=None):
+        if processes:
+            self.executor = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self.executor = ThreadPoolExecutor(workers, thread_name_prefix="schema")
+        self.processes = processes
+        self.batch = batch or (PROCESS_BATCH if processes else 1)
+        self.report = report if report is not None else SchemaReport()
+        self._slots = threading.BoundedSemaphore(max(max_pending // self.batch, 1))
+        self._lock = threading.Lock()
+        self._items = []
+        # seconds submitters spent blocked on a full pool
+        self.blocked_seconds = 0.0
+
+    def submit(self, scenario, instance, schema, root="$"):
+        if self.processes:
+            # checked here, before the batch leaves, so the caller gets the error
+            schema = schema_name(schema)
+        with self._lock:
+            self._items.append((scenario, root, schema, instance))
+            if len(self._items) < self.batch:
+                return
+            items, self._items = self._items, []
+        self._submit(items)
+
+    def _submit(self, items):
+        if not self._slots.acquire(blocking=False):
+            start = time.perf_counter()
+            self._slots.acquire()
+            self.blocked_seconds += time.perf_counter() - start
+        future = self.executor.submit(find_errors_many if self.processes else schema_errors_many,
+                                      [(schema, instance) for _, _, schema, instance in items])
+        future.add_done_callback(lambda done: self._done(done, items))
+
+    def _done(self, future, items):
+        self._slots.release()
+        error = future.exception()
+        if error is not None:
+            failed = [("$", "error", "%s: %s" % (type(error).__name__, error))]
+            results = [failed] * len(items)
+        else:
+            results = future.result()
+        for (scenario, root, _, _), errors in zip(items, results):
+            self.report.add(scenario, errors, root)
+
+    def close(self):
+        """Sends the last partial batch and waits for the queued checks."""
+        with self._lock:
+            items, self._items = self._items, []
+        if items:
+            self._submit(items)
+        self.executor.shutdown(wait=True)
+
+
+report = SchemaReport()
+_pool = None
+
+
+def start_pool(workers, processes=False, max_pending=MAX_PENDING):
+    global _pool
+    stop_pool()
+    _pool = ValidationPool(workers, processes, max_pending, report)
+    return _pool
+
+
+def stop_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+
+def check(scenario, instance, schema, root="$"):
+    """Checks `instance` for the report: "ok" or "invalid" inline,
+    "deferred" when it went to the pool."""
+    if _pool is not None:
+        _pool.submit(scenario, instance, schema, root)
+        return "deferred"
+    errors = schema_errors(schema, instance)
+    report.add(scenario, errors, root)
+    return "invalid" if errors else "ok"
+
+
+def benchmark(number=20000, workers=4):
+    """Seconds the I/O side spends handing over `number` users, inline vs pools."""
+    import schemas
+    user = {"id": 2, "email": "janet.weaver@reqres.in", "first_name": "Janet",
+            "last_name": "Weaver", "avatar": "https://reqres.in/img/faces/2-image.jpg"}
+    for name, pool in (("inline", None), ("threads", ValidationPool(workers)),
+                       ("processes", ValidationPool(workers, processes=True))):
+        local = SchemaReport()
+        start = time.perf_counter()
+        for _ in range(number):
+            if pool is None:
+                local.add("user", find_errors("schema_user", user))
+            else:
+                pool.submit("user", user, schemas.schema_user)
+        handed = time.perf_counter() - start
+        if pool is not None:
+            pool.close()
+        total = time.perf_counter() - start
+        print("%-10s handed over in %6.3f s, all checked in %6.3f s" % (name, handed, total))
+
+
+if __name__ == "__main__":
+    benchmark()
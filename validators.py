@@ -0,0 +1,72 @@
+import timeit
+
+import jsonschema
+from jsonschema.exceptions import best_match
+from jsonschema.validators import validator_for
+
+import schemas
+
+# Compiled validators by id() of the schema dict
+_validators = {}
+
+
+def compile_schema(schema):
+    cls = validator_for(schema)
+    cls.check_schema(schema)
+    return cls(schema)
+
+
+def get_validator(schema):
+    """Validator for a schema dict, compiled on first use and cached."""
+    validator = _validators.get(id(schema))
+    if validator is None or validator.schema is not schema:
+        validator = _validators[id(schema)] = compile_schema(schema)
+    return validator
+
+
+def validate(instance, schema):
+    """Drop-in replacement for jsonschema.validate with a cached validator."""
+    error = best_match(get_validator(schema).iter_errors(instance))
+    if error is not None:
+        raise error
+
+
+def validate_many(responses, schema):
+    """Validates every item of `responses` against `schema`.
+    Returns a list of (index, ValidationError) for the invalid items."""
+    validator = get_validator(schema)
+    errors = []
+    for index, instance in enumerate(responses):
+        if not validator.is_valid(instance):
+            errors.append((index, best_match(validator.iter_errors(instance))))
+    return errors
+
+
+SCHEMAS = {name: value for name, value in vars(schemas).items()
+           if name.startswith("schema_")}
+
+# compile all schemas from schemas.py once at import
+for _schema in SCHEMAS.values():
+    get_validator(_schema)
+
+
+def benchmark(number=10000):
+    """Compares jsonschema.validate with the cached validators on one user."""
+    user = {"id": 2, "email": "janet.weaver@reqres.in", "first_name": "Janet",
+            "last_name": "Weaver", "avatar": "https://reqres.in/img/faces/2-image.jpg"}
+    users = [user] * number
+    results = {
+        "jsonschema.validate": timeit.timeit(
+            lambda: jsonschema.validate(user, schemas.schema_user), number=number),
+        "validators.validate": timeit.timeit(
+            lambda: validate(user, schemas.schema_user), number=number),
+        "validators.validate_many": timeit.timeit(
+            lambda: validate_many(users, schemas.schema_user), number=1),
+    }
+    for name, seconds in results.items():
+        print("%-25s %8.2f us per response" % (name, seconds / number * 1e6))
+    return results
+
+
+if __name__ == "__main__":
+    benchmark()